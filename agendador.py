@@ -0,0 +1,42 @@
+# agendador.py
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+def _cronometrar(funcao, entradas):
+    inicio = time.perf_counter()
+    resultado = funcao(entradas)
+    return resultado, time.perf_counter() - inicio
+
+
+def executar_grafo(tarefas, ao_iniciar=None, ao_concluir=None, max_workers=4):
+    # tarefas: {nome: (dependencias, funcao)}. Cada funcao recebe {dep: resultado}
+    # e roda numa thread assim que todas as suas dependências terminam.
+    # Os callbacks rodam sempre na thread que chamou (seguro para a UI do Streamlit).
+    pendentes = dict(tarefas)
+    resultados, tempos = {}, {}
+    em_execucao = {}
+    inicio = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pendentes or em_execucao:
+            prontos = [n for n, (deps, _) in pendentes.items() if all(d in resultados for d in deps)]
+            for nome in prontos:
+                deps, funcao = pendentes.pop(nome)
+                if ao_iniciar:
+                    ao_iniciar(nome)
+                entradas = {d: resultados[d] for d in deps}
+                em_execucao[pool.submit(_cronometrar, funcao, entradas)] = nome
+
+            if not em_execucao:
+                raise ValueError(f"Dependências impossíveis de resolver: {list(pendentes)}")
+
+            feitos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+            for futuro in feitos:
+                nome = em_execucao.pop(futuro)
+                resultados[nome], tempos[nome] = futuro.result()
+                if ao_concluir:
+                    ao_concluir(nome, resultados[nome], tempos[nome])
+
+    tempos["total"] = time.perf_counter() - inicio
+    return resultados, tempos
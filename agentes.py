@@ -1,77 +1,53 @@
 # agentes.py
-import google.generativeai as genai
-from google.api_core import exceptions as google_exceptions
-import time
-from fpdf import FPDF
-import streamlit as st
 from prompts import PROMPT_PERSONAL, PROMPT_FISIO, PROMPT_NUTRI, PROMPT_MEDICO_GERAL
+from agendador import executar_grafo
+from cache_respostas import obter_cache, chave_resposta
+from contexto import ContextoDebate, ContadorUso, ORCAMENTO_TOKENS_PADRAO, estimar_tokens
+from consenso import extrair_veredito, sem_veredito, agentes_para_reinvocar, VETAR, AJUSTAR, INCOMPLETO
+from plano_secoes import extrair_secoes, mesclar, plano_para_prompt, montar_documento
+from limitador import obter_limitador
+from roteador import obter_roteador, modelo_para
+from rastreio import span, rastreado, registrar
+from referencias import fatos_por_agente
 
 def configurar_google_api():
-    api_key = None
-    try:
-        if "google" in st.secrets and "api_key" in st.secrets["google"]:
-            api_key = st.secrets["google"]["api_key"]
-        elif "GOOGLE_API_KEY" in st.secrets:
-            api_key = st.secrets["GOOGLE_API_KEY"]
-    except:
-        pass
-    
-    if api_key:
-        genai.configure(api_key=api_key)
-        return genai.GenerativeModel(model_name="gemini-2.5-flash-lite",
-                                     generation_config={"temperature": 0.7, "max_output_tokens": 8192})
-    return None
-
-def gerar_pdf(texto_plano):
-    class PDF(FPDF):
-        def header(self):
-            # Logo ou Título
-            self.set_font('Arial', 'B', 16)
-            self.cell(0, 10, 'Plano de Saúde Holística - IA', 0, 1, 'C')
-            self.ln(5)
-            
-        def footer(self):
-            self.set_y(-15)
-            self.set_font('Arial', 'I', 8)
-            self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
-
-    pdf = PDF()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    
-    # Processar texto para simular formatação Markdown básica (Negrito)
-    # FPDF padrão não suporta Markdown nativo, vamos fazer algo simples
-    # ou apenas melhorar a fonte e espaçamento.
-    
-    pdf.set_font("Arial", size=11)
-    
-    # Tratamento básico de caracteres
-    try:
-        linhas = texto_plano.split('\n')
-        for linha in linhas:
-            linha = linha.encode('latin-1', 'replace').decode('latin-1')
-            
-            # Títulos (detectados por ## ou algo assim no markdown original)
-            if linha.strip().startswith('##'):
-                pdf.ln(5)
-                pdf.set_font("Arial", 'B', 14)
-                pdf.multi_cell(0, 8, txt=linha.replace('#', '').strip())
-                pdf.set_font("Arial", size=11)
-            # Subtítulos ou negrito simulado
-            elif linha.strip().startswith('**'):
-                pdf.ln(2)
-                pdf.set_font("Arial", 'B', 11)
-                pdf.multi_cell(0, 6, txt=linha.replace('*', '').strip())
-                pdf.set_font("Arial", size=11)
-            else:
-                pdf.multi_cell(0, 6, txt=linha)
-                
-    except Exception as e:
-        pdf.multi_cell(0, 6, txt=f"Erro ao formatar PDF: {e}")
-        
-    return pdf.output(dest='S').encode('latin-1')
-
-def chamar_especialista(model, persona_prompt, historico_conversa, tarefa_atual, status_container):
+    # Roteador do processo: cada papel usa seu perfil de modelo (roteador.py), com fallback em 429.
+    # Os modelos vêm do registro de modelos.py: secrets, genai.configure e GenerativeModel só na primeira vez
+    roteador = obter_roteador()
+    return roteador if roteador.disponivel() else None
+
+def _textos(resposta):
+    # Pedaços de texto de uma resposta em streaming (stream=True do SDK)
+    for pedaco in resposta:
+        try:
+            texto = pedaco.text
+        except ValueError:
+            # Pedaço sem partes de texto (ex.: só metadados de segurança)
+            continue
+        if texto:
+            yield texto
+
+def gerar_stream(model, prompt):
+    # Entrega o texto em pedaços conforme o modelo vai gerando; a abertura passa pelo limitador
+    # (o SDK já busca o primeiro pedaço dentro de generate_content, então um 429 aparece aqui)
+    limitador = obter_limitador()
+    with span("chat.resposta", tokens_entrada=estimar_tokens(prompt)) as s:
+        resposta = limitador.executar(lambda: model.generate_content(prompt, stream=True), estimar_tokens(prompt))
+        texto = ""
+        for pedaco in _textos(resposta):
+            texto += pedaco
+            yield pedaco
+        s.definir(tokens_saida=estimar_tokens(texto))
+    limitador.consumir_extra(estimar_tokens(texto))
+
+def _tokens_usados(resposta, prompt, texto):
+    # usage_metadata do SDK quando disponível; senão a estimativa local
+    meta = getattr(resposta, "usage_metadata", None)
+    entrada = getattr(meta, "prompt_token_count", 0) or estimar_tokens(prompt)
+    saida = getattr(meta, "candidates_token_count", 0) or estimar_tokens(texto)
+    return entrada, saida
+
+def chamar_especialista(model, persona_prompt, historico_conversa, tarefa_atual, status_container=None, ao_receber=None, usar_cache=True, uso=None):
     prompt_completo = f"""
     {persona_prompt}
     --- HISTÓRICO ---
@@ -79,20 +55,124 @@ def chamar_especialista(model, persona_prompt, historico_conversa, tarefa_atual,
     --- TAREFA ---
     {tarefa_atual}
     """
-    max_tentativas = 3
-    for tentativa in range(max_tentativas):
+    with span("llm.especialista") as s:
+        # Entradas idênticas geram prompts idênticos: reaproveita a resposta já paga
+        cache = obter_cache()
+        chave = chave_resposta(model, persona_prompt, historico_conversa, tarefa_atual)
+        if usar_cache:
+            texto = cache.buscar(chave)
+            if texto is not None:
+                s.definir(cache=True)
+                if uso:
+                    uso.registrar_reaproveitada()
+                if ao_receber:
+                    ao_receber(texto)
+                return texto
+
+        def gerar():
+            if ao_receber is None:
+                resposta = model.generate_content(prompt_completo)
+                return resposta, resposta.text.strip()
+            # Modo streaming: repassa o texto parcial a cada pedaço e monta a resposta completa
+            resposta = model.generate_content(prompt_completo, stream=True)
+            texto = ""
+            for pedaco in _textos(resposta):
+                texto += pedaco
+                ao_receber(texto)
+            return resposta, texto.strip()
+
+        # Limitador compartilhado: token bucket por RPM/TPM, backoff com jitter em 429 e circuit breaker
+        limitador = obter_limitador()
         try:
-            response = model.generate_content(prompt_completo)
-            return response.text.strip()
-        except google_exceptions.TooManyRequests:
-            status_container.warning(f"Aguardando API... ({tentativa+1}/{max_tentativas})")
-            time.sleep(20)
+            resposta, texto = limitador.executar(gerar, estimar_tokens(prompt_completo),
+                                                 ao_aguardar=status_container.warning if status_container else None)
         except Exception as e:
-            status_container.error(f"Erro: {e}")
-            raise e
-    return "ERRO: Sem resposta."
+            if status_container:
+                status_container.error(f"Erro: {e}")
+            raise
+        tokens_entrada, tokens_saida = _tokens_usados(resposta, prompt_completo, texto)
+        limitador.consumir_extra(tokens_saida)
+        s.definir(tokens_entrada=tokens_entrada, tokens_saida=tokens_saida)
+        if uso:
+            uso.registrar_chamada(tokens_entrada, tokens_saida)
+        # A chave é do perfil principal: resposta de um perfil de reserva do roteador não é guardada nela
+        if not getattr(resposta, "fallback", False):
+            cache.guardar(chave, texto)
+        return texto
+
+# Conselho: cada agente declara de quem depende. Fisio e Nutri só precisam do
+# rascunho do Personal, então rodam em paralelo; o Coach consolida os dois.
+AGENTES = [
+    ("Personal Trainer", "🏋️", PROMPT_PERSONAL, "Criar/ajustar plano.", ()),
+    ("Fisioterapeuta", "🩺", PROMPT_FISIO, "Validar segurança.", ("Personal Trainer",)),
+    ("Nutricionista", "🍎", PROMPT_NUTRI, "Inserir Dieta Detalhada.", ("Personal Trainer",)),
+    ("Coach de Saúde", "🧘", PROMPT_MEDICO_GERAL, "Formatar Final.", ("Fisioterapeuta", "Nutricionista")),
+]
+
+# Seção do plano pela qual cada agente responde (usada quando a resposta vem sem marcadores)
+SECAO_PRINCIPAL = {
+    "Personal Trainer": "treino",
+    "Fisioterapeuta": "mobilidade",
+    "Nutricionista": "nutricao",
+    "Coach de Saúde": "bem_estar",
+}
+
+# Quem valida cada seção: se um agente que roda depois dele (ou em paralelo) muda a seção, ele revisa de novo
+VALIDADOR_SECAO = {
+    "treino": "Fisioterapeuta",
+    "mobilidade": "Fisioterapeuta",
+    "nutricao": "Nutricionista",
+    "bem_estar": "Coach de Saúde",
+}
 
-def simular_agentes(d, model):
+def _delta(nome, resposta):
+    # Resposta sem marcadores só vira a seção do agente quando ele ajustou o plano;
+    # com APROVADO/VETO o texto é comentário (ex.: substituições pedidas pelo Fisio), não conteúdo do plano
+    padrao = SECAO_PRINCIPAL[nome] if extrair_veredito(resposta).tipo == AJUSTAR else None
+    return extrair_secoes(sem_veredito(resposta), padrao)
+
+def _dependentes(nome):
+    # Agentes que recebem a saída de `nome` como entrada direta
+    return {a[0] for a in AGENTES if nome in a[4]}
+
+def _ancestrais(nome):
+    deps = {a[0]: a[4] for a in AGENTES}
+    vistos, pilha = set(), list(deps[nome])
+    while pilha:
+        atual = pilha.pop()
+        if atual not in vistos:
+            vistos.add(atual)
+            pilha.extend(deps[atual])
+    return vistos
+
+def _secoes_a_revisar(plano_inicio, plano, deltas):
+    # {validador: [pendências]} das seções que mudaram depois que o validador as viu neste ciclo
+    revisar = {}
+    for secao, validador in VALIDADOR_SECAO.items():
+        viu = _ancestrais(validador) | {validador}
+        visto = mesclar(plano_inicio, *(deltas[n] for n, *_ in AGENTES if n in viu and n in deltas))
+        if plano.get(secao) == visto.get(secao):
+            continue
+        autores = [n for n, *_ in AGENTES if n not in viu and secao in deltas.get(n, {})]
+        revisar.setdefault(validador, []).append(
+            f"a seção {secao} foi alterada por {', '.join(autores)} depois da sua validação; revise o texto atual")
+    return revisar
+
+class ObservadorConselho:
+    # Ganchos do conselho; a base não faz nada. Quem chama (UI, fila de jobs, CLI) sobrescreve o que precisar.
+    # agente_parcial roda na thread do agente; os demais rodam na thread que chamou simular_agentes.
+    def inicio_ciclo(self, ciclo): pass
+    def agente_iniciou(self, ciclo, nome): pass
+    def agente_parcial(self, ciclo, nome, texto): pass
+    def agente_concluiu(self, ciclo, nome, resposta, segundos, tokens_prompt): pass
+    def fim_ciclo(self, ciclo, segundos, consenso): pass
+    def fim(self, uso): pass
+
+@rastreado("conselho.total")
+def simular_agentes(d, model, usar_cache=True, orcamento_tokens=ORCAMENTO_TOKENS_PADRAO, observador=None, checkpoints=None, max_ciclos=2):
+    # checkpoints: {(ciclo, agente): resposta} já concluídos numa execução anterior; são reaproveitados sem chamar a API
+    observador = observador or ObservadorConselho()
+    checkpoints = checkpoints or {}
     desc_user = f"""
     PERFIL: {d['nome']}, {d['idade']} anos, {d['sexo']}. CORPO: {d['peso']}kg, {d['altura']}cm.
     OBJETIVO: {d['objetivo_detalhado']}
@@ -103,54 +183,92 @@ def simular_agentes(d, model):
     """
     
     consenso_atingido = False
-    historico = f"Paciente: {desc_user}\n"
-    plano = "Nenhum plano ainda."
+    # O plano atual vai uma única vez na tarefa; das rodadas anteriores só ficam os vereditos.
+    # O plano é um dicionário de seções: cada agente devolve só as seções que criou ou alterou.
+    contexto = ContextoDebate(desc_user, orcamento_tokens)
+    # Calorias, macros, água e listas de alimentos/exercícios saem prontos de referencias.py, só para quem usa
+    fatos = fatos_por_agente(d)
+    uso = ContadorUso()
+    dependencias = {nome: deps for nome, *_, deps in AGENTES}
+    plano = {}
+    anteriores = {}  # agente -> resposta do último ciclo em que rodou
+    vetos = {}       # agente -> motivos do veto no ciclo anterior
+    revisar = {}     # agente -> seções alteradas depois da sua validação ou resposta sem veredito
     ciclo = 0
-    max_ciclos = 2
 
-    # Container para o debate
-    debate_container = st.container()
-    
-    with debate_container:
-        st.subheader("💬 Reunião do Conselho")
-        
-        while not consenso_atingido and ciclo < max_ciclos:
-            ciclo += 1
-            st.markdown(f"**--- 🔄 Ciclo {ciclo} ---**")
-            oks = []
-
-            # Agentes e seus ícones/nomes
-            agentes = [
-                ("Personal Trainer", "🏋️", PROMPT_PERSONAL, "Criar/ajustar plano."),
-                ("Fisioterapeuta", "🩺", PROMPT_FISIO, "Validar segurança."),
-                ("Nutricionista", "🍎", PROMPT_NUTRI, "Inserir Dieta Detalhada."),
-                ("Coach de Saúde", "🧘", PROMPT_MEDICO_GERAL, "Formatar Final.")
-            ]
-
-            for nome, icon, prompt_persona, tarefa_base in agentes:
-                # Mostra que o agente está pensando
-                with st.spinner(f"{nome} está analisando..."):
-                    tarefa = f"{tarefa_base} Atual: {plano}" if ciclo > 1 or nome != "Personal Trainer" else tarefa_base
-                    resp = chamar_especialista(model, prompt_persona, historico, tarefa, st.empty())
-                    
-                    # Atualiza estado do plano
-                    plano = resp if "Coach" in nome or ciclo > 0 else (plano + "\n" + resp) 
-                    # Nota: A lógica de concatenação original estava sobrescrevendo 'plano = resp'.
-                    # Vamos manter a lógica original de sobrescrever para simplificar, mas o ideal seria evoluir.
-                    plano = resp 
-                    historico += f"{nome}: {resp}\n"
-                    oks.append(resp.lower().strip().startswith('ok'))
-                
-                # Exibe a fala do agente na UI
-                with st.chat_message(nome, avatar=icon):
-                    st.write(f"**{nome}**: {resp[:300]}..." if len(resp) > 300 else f"**{nome}**: {resp}")
-                    with st.expander("Ver detalhes"):
-                        st.markdown(resp)
-                    time.sleep(1) # Pequena pausa dramática para leitura
-
-            if all(oks):
-                consenso_atingido = True
-                st.success("✅ Conselho chegou a um consenso!")
-                time.sleep(1.5)
-    
-    return plano
+    while not consenso_atingido and ciclo < max_ciclos:
+        ciclo += 1
+        observador.inicio_ciclo(ciclo)
+        concluidos = {}
+        tokens_prompt = {}
+        reaproveitados = set()
+        reinvocar = agentes_para_reinvocar(vetos, dependencias) | set(revisar)
+
+        def criar_tarefa(nome, prompt_persona, tarefa_base, deps, plano=plano, ciclo=ciclo, vetos=vetos,
+                         revisar=revisar):
+            def executar(entradas):
+                # Depois do 1º ciclo, só roda quem vetou, quem recebeu veto, quem tem seção a revisar
+                # ou quem teve a entrada alterada
+                if ciclo > 1 and nome not in reinvocar and all(concluidos[d] == anteriores[d] for d in deps):
+                    uso.registrar_reaproveitada()
+                    reaproveitados.add(nome)
+                    return anteriores[nome]
+                if (ciclo, nome) in checkpoints:
+                    return checkpoints[(ciclo, nome)]
+                # Plano visto pelo agente: o do início do ciclo + as seções de quem veio antes dele no grafo
+                # (resposta reaproveitada já está no plano: reaplicar desfaria mudanças feitas depois dela)
+                atual = mesclar(plano, *(_delta(n, concluidos[n]) for n, *_ in AGENTES
+                                         if n in _ancestrais(nome) and n not in reaproveitados))
+                tarefa = f"{tarefa_base} Atual:\n{plano_para_prompt(atual)}" if atual else tarefa_base
+                pendencias = [f"{agente}: {'; '.join(motivos) or 'sem motivo informado'}"
+                              for agente, motivos in vetos.items() if agente == nome or agente in _dependentes(nome)]
+                if pendencias:
+                    tarefa += "\nVETOS A RESOLVER:\n" + "\n".join(pendencias)
+                if nome in revisar:
+                    tarefa += "\nREVISAR ANTES DO VEREDITO:\n" + "\n".join(revisar[nome])
+                # Histórico compacto: decisões anteriores + vereditos de quem veio antes no grafo
+                falas = [(n, concluidos[n]) for n, *_ in AGENTES if n in _ancestrais(nome)]
+                hist = contexto.historico(prompt_persona, tarefa, falas)
+                tokens_prompt[nome] = contexto.medir(ciclo, nome, prompt_persona, hist, tarefa)
+                with span("conselho.agente", agente=nome, ciclo=ciclo):
+                    return chamar_especialista(modelo_para(model, nome), prompt_persona, hist, tarefa, None,
+                                               ao_receber=lambda texto: observador.agente_parcial(ciclo, nome, texto),
+                                               usar_cache=usar_cache, uso=uso)
+            return deps, executar
+
+        tarefas = {nome: criar_tarefa(nome, prompt, tarefa_base + fatos.get(nome, ""), deps)
+                   for nome, _, prompt, tarefa_base, deps in AGENTES}
+
+        def ao_concluir(nome, resp, segundos):
+            concluidos[nome] = resp
+            if nome not in reaproveitados:
+                observador.agente_concluiu(ciclo, nome, resp, segundos, tokens_prompt.get(nome))
+
+        resultados, tempos = executar_grafo(tarefas, lambda nome: observador.agente_iniciou(ciclo, nome),
+                                            ao_concluir, max_workers=len(AGENTES))
+
+        for nome, *_ in AGENTES:
+            if nome not in reaproveitados:
+                contexto.registrar_resposta(ciclo, nome, resultados[nome])
+        anteriores = resultados
+        deltas = {nome: _delta(nome, resultados[nome]) for nome, *_ in AGENTES if nome not in reaproveitados}
+        plano_inicio, plano = plano, mesclar(plano, *deltas.values())
+
+        # Consenso: ninguém vetou, toda resposta trouxe veredito e nenhuma seção mudou depois de validada.
+        # Quem vetou, quem respondeu sem veredito e o validador de uma seção alterada rodam de novo no ciclo seguinte.
+        vereditos = {nome: extrair_veredito(resp) for nome, resp in resultados.items()}
+        vetos = {nome: v.motivos for nome, v in vereditos.items() if v.tipo == VETAR}
+        revisar = _secoes_a_revisar(plano_inicio, plano, deltas)
+        for nome, v in vereditos.items():
+            if v.tipo == INCOMPLETO:
+                revisar.setdefault(nome, []).extend(v.motivos)
+        consenso_atingido = not vetos and not revisar
+        registrar("conselho.ciclo", tempos["total"], ciclo=ciclo)
+        observador.fim_ciclo(ciclo, tempos["total"], consenso_atingido)
+
+    resumo = uso.resumo()
+    print(f"Conselho: {ciclo} ciclo(s), {resumo['chamadas']} chamadas ao LLM, "
+          f"{resumo['tokens_entrada']} tokens de entrada, {resumo['tokens_saida']} de saída, "
+          f"{resumo['reaproveitadas']} respostas reaproveitadas")
+    observador.fim(resumo)
+    return montar_documento(plano)
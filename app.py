@@ -1,12 +1,10 @@
 import streamlit as st
-from paginas.landing import mostrar_landing
-from paginas.anamnese import mostrar_anamnese
-from paginas.dashboard import mostrar_dashboard
-from paginas.admin import mostrar_admin
 from db_manager import init_db
+from fila_jobs import iniciar_workers
 
-# Inicializa Banco de Dados
+# Inicializa Banco de Dados e os workers de geração de planos (uma vez por processo)
 init_db()
+iniciar_workers()
 
 st.set_page_config(page_title="My Personal Team", page_icon="🧬", layout="wide")
 
@@ -56,12 +54,16 @@ if 'plano_final' not in st.session_state: st.session_state.plano_final = ""
 if 'dados_usuario' not in st.session_state: st.session_state.dados_usuario = {}
 if 'chat_history' not in st.session_state: st.session_state.chat_history = []
 
-# Roteador
+# Roteador: cada página é importada só quando é exibida (genai, fpdf e pandas ficam fora da landing)
 if st.session_state.pagina_atual == 'landing':
+    from paginas.landing import mostrar_landing
     mostrar_landing()
 elif st.session_state.pagina_atual == 'anamnese':
+    from paginas.anamnese import mostrar_anamnese
     mostrar_anamnese()
 elif st.session_state.pagina_atual == 'dashboard':
+    from paginas.dashboard import mostrar_dashboard
     mostrar_dashboard()
 elif st.session_state.pagina_atual == 'admin':
+    from paginas.admin import mostrar_admin
     mostrar_admin()
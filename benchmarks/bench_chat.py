@@ -0,0 +1,89 @@
+# benchmarks/bench_chat.py
+# Uso: python benchmarks/bench_chat.py
+# Compara os tokens de entrada por turno do chat: plano inteiro a cada pergunta (antes) x trechos recuperados (depois).
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contexto import prompt_chat, estimar_tokens
+from plano_secoes import montar_documento
+from busca_plano import indice_do_plano
+
+# Plano semanal completo (~4,5 mil caracteres), no formato montado pelo conselho
+TREINOS = {
+    "Segunda": ("Agachamento livre", "Leg press", "Cadeira extensora", "Panturrilha em pé"),
+    "Terça": ("Supino reto", "Supino inclinado com halteres", "Crucifixo", "Tríceps corda"),
+    "Quarta": ("Corrida leve 30min", "Educativos de corrida", "Prancha", "Abdominal bicicleta"),
+    "Quinta": ("Levantamento terra romeno", "Mesa flexora", "Elevação pélvica", "Abdução de quadril"),
+    "Sexta": ("Remada curvada", "Puxada frontal", "Rosca direta", "Face pull"),
+    "Sábado": ("Corrida intervalada 6x400m", "Afundo búlgaro", "Agachamento goblet", "Prancha lateral"),
+}
+TREINO_DIA = """### {dia}
+| Exercício | Séries | Repetições | Descanso |
+|---|---|---|---|
+{linhas}
+
+Observação: aquecer 10 minutos e progredir a carga de {primeiro} quando completar todas as séries com boa técnica."""
+REFEICOES = {
+    "Café da manhã": "2 ovos mexidos, 2 fatias de pão integral, 1 banana e café sem açúcar",
+    "Lanche da manhã": "1 iogurte sem lactose com 30g de aveia e 1 colher de pasta de amendoim",
+    "Almoço": "150g de frango grelhado, 120g de arroz integral, 80g de feijão e salada à vontade",
+    "Lanche da tarde": "1 sanduíche de atum com pão integral e 1 maçã",
+    "Jantar": "150g de peixe assado, 200g de batata-doce e legumes no vapor",
+    "Ceia": "1 scoop de whey com água e 10 castanhas",
+}
+
+PLANO = montar_documento({
+    "treino": "\n\n".join(TREINO_DIA.format(dia=d, primeiro=ex[0], linhas="\n".join(
+        f"| {e} | {3 + i % 2} | {8 + 2 * i}-{10 + 2 * i} | {90 - 15 * i}s |" for i, e in enumerate(ex)))
+        for d, ex in TREINOS.items()) + "\n\nProgressão: a cada 2 semanas, aumente 2,5kg nos básicos ou 1 repetição "
+        "nos acessórios. Semana 5 é de deload: metade das séries com a mesma carga.",
+    "mobilidade": "\n\n".join(f"**{p}**\n- {d}\n- 3 séries de 30s por lado, sem dor" for p, d in (
+        ("Quadril", "Alongamento 90/90 e flexor do quadril em afundo"),
+        ("Tornozelo", "Dorsiflexão com joelho na parede, importante para o agachamento e a corrida"),
+        ("Ombro", "Rotação externa com elástico e deslizamento na parede"),
+        ("Coluna torácica", "Rotação em quatro apoios e extensão no rolo"),
+        ("Joelho direito", "Isometria de cadeira extensora a 60 graus, 5x45s, antes dos treinos de perna"))),
+    "nutricao": "Meta diária: 2100 kcal, 130g de proteína, 230g de carboidrato e 65g de gordura.\n\n" +
+                "\n\n".join(f"**{r}**\n{c}. Substituições: trocar a proteína por ovos, tofu ou carne magra "
+                             f"na mesma quantidade; trocar o carboidrato por mandioca, macarrão ou pão." for r, c in REFEICOES.items()),
+    "bem_estar": "**Sono**\n8h por noite, deitar até 23h, sem telas 30 minutos antes.\n\n"
+                 "**Hidratação**\nMeta de 2,8L por dia (35ml/kg); hoje são 2L. Leve uma garrafa de 1L e encha 3 vezes.\n\n"
+                 "**Estresse**\n10 minutos de respiração diafragmática após o trabalho e uma caminhada leve no domingo.",
+})
+PERFIL = {"nome": "Ana", "idade": 32, "sexo": "Feminino", "peso": 68.0, "altura": 165,
+          "objetivo_detalhado": "Hipertrofia e correr 10km", "local_treino": "Academia", "dias_treino": 6,
+          "lesoes": "Dor no joelho direito", "restricoes": "Lactose", "sono": 7, "estresse": 6}
+PERGUNTAS = (
+    "Posso trocar o agachamento de sábado por leg press por causa do joelho?",
+    "E quanto tempo de descanso entre as séries?",
+    "O que como no lanche da tarde se não tiver frango?",
+    "Quantos litros de água devo beber?",
+    "Como faço a mobilidade de tornozelo?",
+    "Tenho intolerância a lactose, o café da manhã está ok?",
+)
+
+def main():
+    historico = []
+    print(f"Plano com {len(PLANO)} caracteres")
+    print(f"{'turno':>5} {'antes':>7} {'depois':>7} {'economia':>9}")
+    total_antes = total_depois = 0
+    for turno, pergunta in enumerate(PERGUNTAS, start=1):
+        antes = estimar_tokens(f"Plano atual:\n{PLANO}\nUsuário disse: {pergunta}")
+        depois = estimar_tokens(prompt_chat(PLANO, PERFIL, historico, pergunta))
+        total_antes += antes
+        total_depois += depois
+        print(f"{turno:>5} {antes:>7} {depois:>7} {1 - depois / antes:>9.0%}")
+        historico += [{"role": "user", "content": pergunta},
+                      {"role": "assistant", "content": "Resposta de exemplo do assistente. " * 12}]
+    print(f"{'total':>5} {total_antes:>7} {total_depois:>7} {1 - total_depois / total_antes:>9.0%}")
+
+    inicio = time.perf_counter()
+    for _ in range(1000):
+        indice_do_plano(PLANO, PERFIL).buscar(PERGUNTAS[0])
+    print(f"Busca no índice (em cache): {(time.perf_counter() - inicio):.3f} ms por consulta")
+
+if __name__ == "__main__":
+    main()
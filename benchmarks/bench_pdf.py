@@ -0,0 +1,61 @@
+# benchmarks/bench_pdf.py
+# Uso: python benchmarks/bench_pdf.py
+# Mede tempo de renderização e tamanho do PDF para planos longos, e o custo das chamadas em cache.
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_manager
+
+SECAO = """## 🏋️ Treino {n}
+**Objetivo:** hipertrofia com foco em **membros inferiores**.
+
+| Exercício | Séries | Repetições | Descanso |
+|---|---|---|---|
+| Leg Press | 4 | 10-12 | 90s |
+| Cadeira Extensora | 3 | 12-15 | 60s |
+| Stiff com halteres (manter coluna neutra) | 3 | 10 | 90s |
+
+- Aquecimento de 10 minutos na bicicleta
+- Mobilidade de quadril: **3x30s** por lado
+  - Progressão: aumentar a carga quando completar todas as séries
+1. Café da manhã: 2 ovos, 1 pão integral, 1 banana
+2. Almoço: 150g de frango, 100g de arroz, salada à vontade
+
+Texto corrido explicando a lógica do treino e a importância do descanso entre as sessões.
+---
+"""
+
+def plano_longo(n_secoes):
+    return "".join(SECAO.format(n=i) for i in range(n_secoes))
+
+def cronometrar(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = funcao()
+    return (time.perf_counter() - inicio) / repeticoes, resultado
+
+def main():
+    with tempfile.TemporaryDirectory() as pasta:
+        db_manager.DB_NAME = os.path.join(pasta, "bench.db")
+        db_manager.init_db()
+        from pdf_plano import gerar_pdf, pdf_do_plano
+
+        print(f"{'seções':>7} {'chars':>8} {'render (ms)':>12} {'KB':>8} {'banco (ms)':>11} {'memo (ms)':>10}")
+        for n in (5, 20, 80):
+            texto = plano_longo(n)
+            db_manager.salvar_plano(1, texto)
+            t_render, pdf = cronometrar(lambda: gerar_pdf(texto), 5)
+            pdf_do_plano(texto)  # primeira chamada renderiza e persiste
+            t_banco, _ = cronometrar(lambda: pdf_do_plano(texto), 20)
+            memo = {}
+            pdf_do_plano(texto, memo)
+            t_memo, _ = cronometrar(lambda: pdf_do_plano(texto, memo), 1000)
+            print(f"{n:>7} {len(texto):>8} {t_render * 1000:>12.1f} {len(pdf) / 1024:>8.1f} "
+                  f"{t_banco * 1000:>11.2f} {t_memo * 1000:>10.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/bench_rastreio.py
+# Uso: python benchmarks/bench_rastreio.py
+# Custo por chamada do rastreio desligado x ligado, isolado e numa consulta real ao banco.
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_manager
+import rastreio
+
+N = 200000
+
+def cronometrar(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+def vazio():
+    pass
+
+@rastreio.rastreado("bench.decorada")
+def decorada():
+    pass
+
+def com_span():
+    with rastreio.span("bench.span"):
+        pass
+
+def main():
+    with tempfile.TemporaryDirectory() as pasta:
+        db_manager.DB_NAME = os.path.join(pasta, "bench.db")
+        db_manager.init_db()
+        usuario_id = db_manager.salvar_usuario({"nome": "bench"})
+        db_manager.salvar_plano(usuario_id, "## Plano\n" * 200)
+        consulta = lambda: db_manager.ler_plano_recente(usuario_id)
+
+        print(f"{'caso':<22} {'desligado (µs)':>15} {'ligado (µs)':>12}")
+        base = cronometrar(vazio, N)
+        print(f"{'função vazia':<22} {base:>15.3f} {'':>12}")
+        for nome, funcao, n in (("@rastreado", decorada, N), ("with span()", com_span, N),
+                                ("ler_plano_recente", consulta, N // 20)):
+            rastreio.ativar(False)
+            desligado = cronometrar(funcao, n)
+            rastreio.ativar(True)
+            ligado = cronometrar(funcao, n)
+            rastreio.limpar()
+            print(f"{nome:<22} {desligado:>15.3f} {ligado:>12.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# benchmarks/bench_startup.py
+# Uso: python benchmarks/bench_startup.py
+# Mede, em processos novos (import a frio), o custo de importar cada página e o tempo até a
+# primeira renderização da landing via streamlit.testing.AppTest.
+import os
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PESADOS = ("google.generativeai", "fpdf", "pandas")
+
+IMPORT = """
+import sys, time
+sys.path.insert(0, {raiz!r})
+import streamlit
+t = time.perf_counter()
+import {modulo}
+dt = time.perf_counter() - t
+print(dt, ",".join(m for m in {pesados!r} if m in sys.modules))
+"""
+
+RENDER = """
+import sys, time
+sys.path.insert(0, {raiz!r})
+t = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=60).run()
+assert not at.exception, at.exception
+print(time.perf_counter() - t, ",".join(m for m in {pesados!r} if m in sys.modules))
+"""
+
+def rodar(codigo, pasta, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, "-W", "ignore", "-c", codigo], cwd=pasta,
+                               capture_output=True, text=True, check=True).stdout.strip().splitlines()[-1]
+        segundos, carregados = saida.split(" ", 1) if " " in saida else (saida, "")
+        tempos.append(float(segundos))
+    return min(tempos), carregados or "-"
+
+def main(repeticoes=3):
+    with tempfile.TemporaryDirectory() as pasta:
+        print(f"{'alvo':<28} {'melhor de ' + str(repeticoes) + ' (ms)':>20}  pesados carregados")
+        for modulo in ("paginas.landing", "paginas.anamnese", "paginas.dashboard", "paginas.admin"):
+            segundos, carregados = rodar(IMPORT.format(raiz=RAIZ, modulo=modulo, pesados=PESADOS), pasta, repeticoes)
+            print(f"{'import ' + modulo:<28} {segundos * 1000:>20.1f}  {carregados}")
+        segundos, carregados = rodar(RENDER.format(raiz=RAIZ, app=os.path.join(RAIZ, "app.py"), pesados=PESADOS),
+                                     pasta, repeticoes)
+        print(f"{'1ª render da landing':<28} {segundos * 1000:>20.1f}  {carregados}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# benchmarks/bench_suite.py
+# Uso: python benchmarks/bench_suite.py [--rapido] [--salvar base.json] [--comparar base.json] [--tolerancia 0.3]
+# Suíte offline e determinística (modelo_falso.py no lugar do Gemini, banco em pasta temporária):
+# latência do conselho, sessões concorrentes com e sem 429, roteamento por perfil, chat, metas
+# nutricionais em lote, banco em escala, check-ins e PDF.
+# Com --comparar, sai com código 1 se alguma métrica piorar mais que a tolerância.
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+# Os limites reais da API deixariam tudo esperando no limitador; aqui medimos o app, não a cota
+os.environ.setdefault("MPT_RPM", "100000")
+os.environ.setdefault("MPT_TPM", "100000000")
+
+import db_manager
+import cache_respostas
+import limitador
+from rastreio import percentil
+
+# Latência e velocidade parecidas com o gemini-2.5-flash-lite, em escala reduzida para a suíte rodar rápido
+LATENCIA = 0.05
+TOKENS_POR_SEGUNDO = 4000.0
+
+PERFIL = dict(nome="Bench", idade=30, sexo="Masculino", peso=80.0, altura=178, objetivo_detalhado="Hipertrofia",
+              rotina_texto="Trabalho 9h-18h", dias_treino=3, local_treino="Academia", tempo_treino=60, lesoes="Joelho",
+              saude_geral="", cozinha="Sim", refeicoes_dia="4", orcamento="Médio", agua_atual=2.0)
+PERGUNTAS = ("Posso trocar o agachamento por leg press?", "Quanto de água devo beber?",
+             "O que como no almoço?", "Como faço a mobilidade de quadril?")
+
+def percentis(valores):
+    ordenados = sorted(valores)
+    return percentil(ordenados, 50), percentil(ordenados, 95)
+
+def modelo(taxa_429=0.0, semente=42):
+    from modelo_falso import ModeloFalso
+    return ModeloFalso(latencia=LATENCIA, tokens_por_segundo=TOKENS_POR_SEGUNDO, taxa_429=taxa_429,
+                       espera_429=0.05, semente=semente)
+
+def bench_conselho(n):
+    from agentes import simular_agentes
+    m = modelo()
+    duracoes = []
+    for i in range(n):
+        inicio = time.perf_counter()
+        simular_agentes(dict(PERFIL, nome=f"Bench{i}"), m, usar_cache=False)
+        duracoes.append(time.perf_counter() - inicio)
+    p50, p95 = percentis(duracoes)
+    return {"conselho.p50_s": p50, "conselho.p95_s": p95, "conselho.chamadas_por_plano": m.chamadas / n}
+
+def bench_sessoes(sessoes, planos_por_sessao, taxa_429):
+    # Cada sessão é uma thread gerando planos em sequência, como os workers da fila de jobs
+    from agentes import simular_agentes
+    m = modelo(taxa_429, semente=7)
+    duracoes, lock = [], threading.Lock()
+
+    def sessao(s):
+        for i in range(planos_por_sessao):
+            inicio = time.perf_counter()
+            simular_agentes(dict(PERFIL, nome=f"S{s}-{i}"), m, usar_cache=False)
+            with lock:
+                duracoes.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=sessao, args=(s,)) for s in range(sessoes)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - inicio
+    p50, p95 = percentis(duracoes)
+    sufixo = "429" if taxa_429 else "ok"
+    return {f"sessoes_{sufixo}.planos_por_min": len(duracoes) / total * 60, f"sessoes_{sufixo}.p50_s": p50,
+            f"sessoes_{sufixo}.p95_s": p95, f"sessoes_{sufixo}.erros_429": m.erros_429}
+
+def bench_roteamento(n):
+    # Conselho pelo roteador, com o modelo da consolidação em 429 metade das vezes: mede o custo do fallback
+    from agentes import simular_agentes
+    from modelo_falso import ModeloFalso
+    from roteador import Roteador
+    fabrica = lambda nome, config: ModeloFalso(nome, config, latencia=LATENCIA, tokens_por_segundo=TOKENS_POR_SEGUNDO,
+                                               taxa_429=0.5 if nome == "gemini-2.5-flash" else 0.0, espera_429=0.05,
+                                               semente=11)
+    roteador = Roteador(fabrica=fabrica)
+    duracoes = []
+    for i in range(n):
+        inicio = time.perf_counter()
+        simular_agentes(dict(PERFIL, nome=f"Rota{i}"), roteador, usar_cache=False)
+        duracoes.append(time.perf_counter() - inicio)
+    perfis = roteador.estatisticas()
+    return {"roteamento.p50_s": percentis(duracoes)[0],
+            "roteamento.fallbacks_por_plano": sum(p["fallbacks"] for p in perfis) / n,
+            "roteamento.custo_mil_planos_usd": sum(p["custo_usd"] for p in perfis) / n * 1000}
+
+def bench_chat(turnos):
+    from agentes import simular_agentes, gerar_stream
+    from contexto import prompt_chat, estimar_tokens
+    m = modelo()
+    plano = simular_agentes(PERFIL, m, usar_cache=False)
+    historico, primeiros, totais, tokens = [], [], [], []
+    for i in range(turnos):
+        pergunta = PERGUNTAS[i % len(PERGUNTAS)]
+        inicio = time.perf_counter()
+        ctx = prompt_chat(plano, PERFIL, historico, pergunta)
+        pedacos = gerar_stream(m, ctx)
+        next(pedacos)
+        primeiros.append(time.perf_counter() - inicio)
+        resposta = "".join(pedacos)
+        totais.append(time.perf_counter() - inicio)
+        tokens.append(estimar_tokens(ctx))
+        historico += [{"role": "user", "content": pergunta}, {"role": "assistant", "content": resposta}]
+    return {"chat.primeiro_pedaco_p50_s": percentis(primeiros)[0], "chat.turno_p50_s": percentis(totais)[0],
+            "chat.tokens_por_turno": sum(tokens) / len(tokens)}
+
+def bench_metas(n_perfis):
+    # Metas de um lote inteiro numa chamada vetorizada x perfil a perfil, e os fatos que vão aos prompts
+    from referencias import metas_lote, metas, fatos_por_agente
+    perfis = [dict(PERFIL, peso=50.0 + i % 60, altura=150 + i % 45, idade=18 + i % 50, dias_treino=i % 8)
+              for i in range(n_perfis)]
+    inicio = time.perf_counter()
+    metas_lote(perfis)
+    lote = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    for p in perfis[:1000]:
+        metas(p)
+    um_a_um = (time.perf_counter() - inicio) / 1000 * n_perfis
+    fatos = []
+    for p in perfis[:200]:
+        t = time.perf_counter()
+        fatos_por_agente(p)
+        fatos.append(time.perf_counter() - t)
+    return {"metas.lote_ms": lote * 1000, "metas.um_a_um_ms": um_a_um * 1000,
+            "metas.fatos_p50_ms": percentis(fatos)[0] * 1000}
+
+def bench_banco(n_usuarios):
+    plano = "## 🏋️ PLANO DE TREINO\n\n" + "| Exercício | 4 | 10 | 90s |\n" * 150
+    inicio = time.perf_counter()
+    with db_manager.transacao() as conn:
+        for i in range(n_usuarios):
+            db_manager.gravar_usuario_e_plano(conn, dict(PERFIL, nome=f"Usuario{i:06d}"), plano + str(i))
+    escrita = time.perf_counter() - inicio
+
+    # Duas passadas: a primeira aquece o cache de páginas do SQLite, a segunda é medida
+    leituras = []
+    for passada in range(2):
+        for i in range(0, n_usuarios, max(1, n_usuarios // 1000)):
+            t = time.perf_counter()
+            db_manager.ler_plano_recente(i + 1)
+            if passada:
+                leituras.append(time.perf_counter() - t)
+    paginas, cursor = [], None
+    for _ in range(50):
+        t = time.perf_counter()
+        linhas = db_manager.listar_planos_pagina(cursor, "", None, None, 50)
+        paginas.append(time.perf_counter() - t)
+        cursor = linhas[-1]["id"]
+    estatisticas = []
+    for _ in range(7):
+        t = time.perf_counter()
+        db_manager.estatisticas_admin()
+        estatisticas.append(time.perf_counter() - t)
+    return {"banco.escritas_por_s": n_usuarios / escrita, "banco.ler_plano_p50_ms": percentis(leituras)[0] * 1000,
+            "banco.pagina_admin_p50_ms": percentis(paginas)[0] * 1000,
+            "banco.estatisticas_p50_ms": percentis(estatisticas)[0] * 1000}
+
+def bench_checkins(dias):
+    # Anos de check-ins diários de um usuário: o painel lê só os rollups, então não deve crescer com o histórico
+    usuario_id = db_manager.salvar_usuario(dict(PERFIL, nome="Checkins"))
+    hoje = date.today()
+    escritas = []
+    for i in range(dias, 0, -1):
+        t = time.perf_counter()
+        db_manager.registrar_checkin(usuario_id, hoje - timedelta(days=i - 1), {"treino": i % 3 != 0, "sono": True})
+        escritas.append(time.perf_counter() - t)
+    leituras = []
+    for _ in range(50):
+        t = time.perf_counter()
+        db_manager.progresso_checkins(usuario_id, hoje=hoje)
+        leituras.append(time.perf_counter() - t)
+    return {"checkins.registrar_p50_ms": percentis(escritas)[0] * 1000,
+            "checkins.progresso_p50_ms": percentis(leituras)[0] * 1000}
+
+def bench_pdf(secoes):
+    from bench_pdf import plano_longo
+    from pdf_plano import gerar_pdf
+    texto = plano_longo(secoes)
+    duracoes = []
+    for _ in range(15):
+        t = time.perf_counter()
+        gerar_pdf(texto)
+        duracoes.append(time.perf_counter() - t)
+    return {"pdf.render_p50_ms": percentis(duracoes)[0] * 1000}
+
+# Métricas em que maior é melhor; nas demais (tempos) menor é melhor
+MAIOR_MELHOR = ("planos_por_min", "escritas_por_s")
+SEM_COMPARACAO = ("erros_429", "chamadas_por_plano", "tokens_por_turno", "fallbacks_por_plano")
+
+def comparar(atual, base, tolerancia):
+    pioras = []
+    print(f"\n{'métrica':<34} {'base':>10} {'atual':>10} {'variação':>9}")
+    for nome, valor in atual.items():
+        if nome not in base or not base[nome]:
+            continue
+        variacao = valor / base[nome] - 1
+        piorou = -variacao if nome.endswith(MAIOR_MELHOR) else variacao
+        marca = ""
+        if not nome.endswith(SEM_COMPARACAO) and piorou > tolerancia:
+            pioras.append(nome)
+            marca = "  <-- REGRESSÃO"
+        print(f"{nome:<34} {base[nome]:>10.3f} {valor:>10.3f} {variacao:>+9.0%}{marca}")
+    return pioras
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rapido", action="store_true", help="tamanhos menores, para rodar a cada mudança")
+    parser.add_argument("--salvar", help="grava as métricas em JSON (ex.: base.json)")
+    parser.add_argument("--comparar", help="compara com um JSON salvo antes")
+    parser.add_argument("--tolerancia", type=float, default=0.3)
+    args = parser.parse_args()
+    n = 1 if args.rapido else 4
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db_manager.DB_NAME = os.path.join(pasta, "bench.db")
+        db_manager.init_db()
+        cache_respostas._cache = cache_respostas.CacheRespostas(os.path.join(pasta, "cache.db"))
+        # Backoff curto: com 429 injetado a suíte mede o caminho de retry sem esperar segundos reais
+        limitador.ESPERA_BASE = 0.05
+
+        metricas = {}
+        for nome, etapa in (("conselho", lambda: bench_conselho(5 * n)),
+                            ("sessoes", lambda: bench_sessoes(8, n, 0.0)),
+                            ("sessoes com 429", lambda: bench_sessoes(8, n, 0.05)),
+                            ("roteamento", lambda: bench_roteamento(5 * n)),
+                            ("chat", lambda: bench_chat(10 * n)),
+                            ("metas", lambda: bench_metas(10000)),
+                            ("banco", lambda: bench_banco(5000 * n)),
+                            ("checkins", lambda: bench_checkins(365 * n)),
+                            ("pdf", lambda: bench_pdf(20))):
+            inicio = time.perf_counter()
+            # O resumo que o conselho imprime a cada plano só atrapalharia a tabela
+            with contextlib.redirect_stdout(io.StringIO()):
+                metricas.update(etapa())
+            print(f"[{nome}] {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+
+    for nome, valor in metricas.items():
+        print(f"{nome:<34} {valor:>10.3f}")
+    if args.salvar:
+        with open(args.salvar, "w") as f:
+            json.dump(metricas, f, indent=2)
+    if args.comparar:
+        with open(args.comparar) as f:
+            pioras = comparar(metricas, json.load(f), args.tolerancia)
+        if pioras:
+            print(f"\n{len(pioras)} métrica(s) pioraram mais de {args.tolerancia:.0%}: {', '.join(pioras)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
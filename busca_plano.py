@@ -0,0 +1,124 @@
+# busca_plano.py
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from plano_secoes import SECOES, secoes_do_documento
+
+# BM25 local: o chat manda ao modelo só os trechos do plano e do perfil ligados à pergunta
+K1 = 1.5
+B = 0.75
+MAX_CHARS_TRECHO = 600
+MAX_INDICES = 32
+
+_STOPWORDS = set("""a o as os um uma uns umas de do da dos das no na nos nas em por para pra com sem
+e ou que se eu me meu minha voce você ele ela isso esse essa este esta ao aos à às é ser ter tem
+posso pode qual quais como quando onde porque por que mais menos muito muita já não sim""".split())
+_TITULOS = dict(SECOES)
+
+# Campos do perfil que viram trechos pesquisáveis (rótulo, chaves em dados_usuario)
+_CAMPOS_PERFIL = (
+    ("Dados básicos", ("idade", "sexo", "peso", "altura")),
+    ("Objetivo", ("objetivo_detalhado",)),
+    ("Rotina e treino", ("rotina_texto", "local_treino", "dias_treino", "tempo_treino", "trabalho")),
+    ("Lesões e saúde", ("lesoes", "saude_geral")),
+    ("Alimentação", ("cozinha", "refeicoes_dia", "orcamento", "restricoes", "suplementos", "agua_atual")),
+    ("Sono e estresse", ("sono", "estresse")),
+)
+
+def termos(texto):
+    # Minúsculas sem acento e sem stopwords; prefixo de 6 letras como stemming barato (treino/treinos/treinar)
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return [p[:6] for p in re.findall(r"[a-z0-9]+", texto) if len(p) > 1 and p not in _STOPWORDS]
+
+_SUBTITULO = re.compile(r"^\s*(#{3,}\s+.+|\*\*[^*]+\*\*:?)\s*$")
+
+def _blocos(texto):
+    # Subtítulos (### Dia, **Café da manhã**) abrem um bloco novo e ficam de cabeçalho dele
+    subtitulo, linhas = "", []
+    for linha in texto.splitlines():
+        if _SUBTITULO.match(linha):
+            if "".join(linhas).strip():
+                yield subtitulo, "\n".join(linhas).strip()
+            subtitulo, linhas = linha.strip(), []
+        else:
+            linhas.append(linha)
+    if "".join(linhas).strip() or subtitulo:
+        yield subtitulo, "\n".join(linhas).strip()
+
+def _quebrar(secao, texto):
+    # Blocos grandes são divididos por parágrafo até MAX_CHARS_TRECHO; título e subtítulo vão em cada trecho
+    titulo = _TITULOS.get(secao, secao)
+    trechos = []
+    for subtitulo, corpo in _blocos(texto):
+        cabecalho = f"{titulo}\n{subtitulo}\n" if subtitulo else f"{titulo}\n"
+        atual = ""
+        for paragrafo in re.split(r"\n\s*\n", corpo):
+            paragrafo = paragrafo.strip()
+            if not paragrafo:
+                continue
+            if atual and len(atual) + len(paragrafo) > MAX_CHARS_TRECHO:
+                trechos.append(cabecalho + atual)
+                atual = ""
+            atual = f"{atual}\n\n{paragrafo}" if atual else paragrafo
+        if atual or subtitulo:
+            trechos.append(cabecalho + atual)
+    return trechos
+
+def trechos_do_plano(plano_texto, perfil=None):
+    trechos = []
+    for secao, texto in secoes_do_documento(plano_texto or "").items():
+        trechos.extend(_quebrar(secao, texto))
+    for rotulo, chaves in _CAMPOS_PERFIL:
+        valores = [f"{c}: {perfil[c]}" for c in chaves if perfil and perfil.get(c) not in (None, "")]
+        if valores:
+            trechos.append(f"Perfil - {rotulo}: " + ", ".join(valores))
+    return trechos
+
+class IndiceBM25:
+    def __init__(self, trechos):
+        self.trechos = trechos
+        self.frequencias = [Counter(termos(t)) for t in trechos]
+        self.tamanhos = [sum(f.values()) for f in self.frequencias]
+        self.tamanho_medio = sum(self.tamanhos) / len(self.tamanhos) if self.tamanhos else 0.0
+        documentos = Counter(termo for f in self.frequencias for termo in f)
+        n = len(trechos)
+        self.idf = {termo: math.log(1 + (n - df + 0.5) / (df + 0.5)) for termo, df in documentos.items()}
+
+    def pontuar(self, consulta):
+        pontos = [0.0] * len(self.trechos)
+        for termo in set(termos(consulta)):
+            idf = self.idf.get(termo)
+            if idf is None:
+                continue
+            for i, freq in enumerate(self.frequencias):
+                tf = freq.get(termo)
+                if tf:
+                    norma = 1 - B + B * self.tamanhos[i] / self.tamanho_medio
+                    pontos[i] += idf * tf * (K1 + 1) / (tf + K1 * norma)
+        return pontos
+
+    def buscar(self, consulta, k=3):
+        # Trechos com pontuação > 0, os melhores primeiro
+        pontos = self.pontuar(consulta)
+        ordem = sorted((i for i, p in enumerate(pontos) if p > 0), key=lambda i: -pontos[i])
+        return [self.trechos[i] for i in ordem[:k]]
+
+# Índices por processo, chaveados pelo plano e perfil: montar o índice de novo a cada turno é desperdício
+_indices = OrderedDict()
+_indices_lock = threading.Lock()
+
+def indice_do_plano(plano_texto, perfil=None):
+    chave = (plano_texto, tuple(sorted((k, str(v)) for k, v in (perfil or {}).items())))
+    with _indices_lock:
+        if chave in _indices:
+            _indices.move_to_end(chave)
+            return _indices[chave]
+    indice = IndiceBM25(trechos_do_plano(plano_texto, perfil))
+    with _indices_lock:
+        _indices[chave] = indice
+        while len(_indices) > MAX_INDICES:
+            _indices.popitem(last=False)
+    return indice
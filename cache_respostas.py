@@ -0,0 +1,119 @@
+# cache_respostas.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from db_manager import DB_NAME
+
+# O cache em disco fica ao lado do banco principal
+CACHE_DB = os.path.join(os.path.dirname(DB_NAME), "cache_respostas.db")
+
+def chave_resposta(model, persona_prompt, historico_conversa, tarefa_atual):
+    # Mesmo modelo + mesma config + mesmo prompt => mesma chave
+    nome_modelo = getattr(model, "model_name", type(model).__name__)
+    config = getattr(model, "_generation_config", None)
+    bruto = json.dumps([nome_modelo, config, persona_prompt, historico_conversa, tarefa_atual],
+                       sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+class CacheRespostas:
+    def __init__(self, caminho=CACHE_DB, max_memoria=256, max_bytes_disco=50 * 1024 * 1024, ttl_segundos=7 * 24 * 3600):
+        self.caminho = caminho
+        self.max_memoria = max_memoria
+        self.max_bytes_disco = max_bytes_disco
+        self.ttl_segundos = ttl_segundos
+        self.memoria = OrderedDict()  # chave -> (criado_em, texto), em ordem LRU
+        self.contadores = {"hits_memoria": 0, "hits_disco": 0, "misses": 0, "gravacoes": 0, "remocoes": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS respostas (
+                                chave TEXT PRIMARY KEY,
+                                resposta TEXT,
+                                tamanho INTEGER,
+                                criado_em REAL,
+                                ultimo_acesso REAL
+                            )''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_respostas_acesso ON respostas (ultimo_acesso)")
+        self._conn.commit()
+        self._bytes_disco = self._conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+
+    def buscar(self, chave):
+        agora = time.time()
+        with self._lock:
+            item = self.memoria.get(chave)
+            if item and agora - item[0] < self.ttl_segundos:
+                self.memoria.move_to_end(chave)
+                self.contadores["hits_memoria"] += 1
+                return item[1]
+
+            row = self._conn.execute("SELECT resposta, criado_em FROM respostas WHERE chave = ?", (chave,)).fetchone()
+            if row and agora - row[1] < self.ttl_segundos:
+                self._conn.execute("UPDATE respostas SET ultimo_acesso = ? WHERE chave = ?", (agora, chave))
+                self._conn.commit()
+                self._guardar_memoria(chave, row[1], row[0])
+                self.contadores["hits_disco"] += 1
+                return row[0]
+
+            self.contadores["misses"] += 1
+            return None
+
+    def guardar(self, chave, texto):
+        agora = time.time()
+        tamanho = len(texto.encode("utf-8"))
+        with self._lock:
+            self._guardar_memoria(chave, agora, texto)
+            antigo = self._conn.execute("SELECT tamanho FROM respostas WHERE chave = ?", (chave,)).fetchone()
+            self._conn.execute("INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?)", (chave, texto, tamanho, agora, agora))
+            self._bytes_disco += tamanho - (antigo[0] if antigo else 0)
+            self.contadores["gravacoes"] += 1
+            self._expulsar_disco(agora)
+            self._conn.commit()
+
+    def _guardar_memoria(self, chave, criado_em, texto):
+        self.memoria[chave] = (criado_em, texto)
+        self.memoria.move_to_end(chave)
+        while len(self.memoria) > self.max_memoria:
+            self.memoria.popitem(last=False)
+            self.contadores["remocoes"] += 1
+
+    def _expulsar_disco(self, agora):
+        # Primeiro o que venceu o TTL, depois os menos usados até caber no limite de tamanho
+        c = self._conn.execute("DELETE FROM respostas WHERE criado_em < ?", (agora - self.ttl_segundos,))
+        removidos = c.rowcount
+        if c.rowcount:
+            self._bytes_disco = self._conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+        if self._bytes_disco > self.max_bytes_disco:
+            excesso = self._bytes_disco - self.max_bytes_disco
+            chaves = []
+            for chave, tamanho in self._conn.execute("SELECT chave, tamanho FROM respostas ORDER BY ultimo_acesso"):
+                chaves.append((chave,))
+                excesso -= tamanho
+                self._bytes_disco -= tamanho
+                if excesso <= 0:
+                    break
+            self._conn.executemany("DELETE FROM respostas WHERE chave = ?", chaves)
+            removidos += len(chaves)
+        self.contadores["remocoes"] += removidos
+
+    def estatisticas(self):
+        with self._lock:
+            total = sum(self.contadores.values()) - self.contadores["gravacoes"] - self.contadores["remocoes"]
+            hits = self.contadores["hits_memoria"] + self.contadores["hits_disco"]
+            return {**self.contadores,
+                    "taxa_acerto": hits / total if total else 0.0,
+                    "itens_memoria": len(self.memoria),
+                    "bytes_disco": self._bytes_disco}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def obter_cache():
+    # Um único cache por processo, compartilhado entre as sessões do Streamlit
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CacheRespostas()
+        return _cache
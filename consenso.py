@@ -0,0 +1,51 @@
+# consenso.py
+import re
+from collections import namedtuple
+
+APROVAR, VETAR, AJUSTAR, INCOMPLETO = "aprovar", "vetar", "ajustar", "incompleto"
+
+Veredito = namedtuple("Veredito", "tipo motivos")
+
+# Última linha "VEREDITO: ..." da resposta; aceita variações comuns de caixa, acento e markdown
+_LINHA_VEREDITO = re.compile(r"^[\s*_>#-]*VEREDITO[\s*_]*:[\s*_]*([A-Za-zÀ-ú]+)[\s*_]*[-–—:]?\s*(.*)$",
+                             re.IGNORECASE | re.MULTILINE)
+_TIPOS = {
+    "aprovado": APROVAR, "aprovada": APROVAR, "aprovo": APROVAR, "aprovar": APROVAR, "ok": APROVAR,
+    "approve": APROVAR, "approved": APROVAR,
+    "veto": VETAR, "vetado": VETAR, "vetada": VETAR, "vetar": VETAR, "vetos": VETAR,
+    "reprovado": VETAR, "reprovada": VETAR, "reprovo": VETAR, "reprovar": VETAR,
+    "rejeitado": VETAR, "rejeitada": VETAR, "rejeito": VETAR, "recusado": VETAR, "recusada": VETAR,
+    "negado": VETAR, "negada": VETAR, "não": VETAR, "nao": VETAR, "reject": VETAR, "rejected": VETAR,
+    "ajuste": AJUSTAR, "ajustes": AJUSTAR, "ajustado": AJUSTAR, "ajustada": AJUSTAR, "ajustar": AJUSTAR,
+    "patch": AJUSTAR,
+}
+
+def extrair_veredito(resposta):
+    encontrados = _LINHA_VEREDITO.findall(resposta)
+    if encontrados:
+        palavra, resto = encontrados[-1]
+        tipo = _TIPOS.get(palavra.lower())
+        if tipo is None:
+            # Linha de veredito com palavra desconhecida não conta como acordo: vira veto e o agente refaz
+            return Veredito(VETAR, [f"veredito não reconhecido ({palavra}); responda no formato pedido"])
+        motivos = [m.strip(" .*_") for m in re.split(r"[;|]", resto) if m.strip(" .*_")]
+        return Veredito(tipo, motivos)
+    # Respostas sem a linha estruturada: mantém a convenção antiga de começar com 'ok'
+    inicio = resposta.lower().strip()
+    if inicio.startswith("ok"):
+        return Veredito(APROVAR, [])
+    if inicio.startswith("vet"):
+        return Veredito(VETAR, [resposta.strip().splitlines()[0]])
+    # Sem veredito nenhum (ex.: resposta cortada no max_output_tokens): não conta como acordo, o agente refaz
+    return Veredito(INCOMPLETO, ["resposta sem a linha VEREDITO (cortada ou fora do formato); reenvie completa"])
+
+def sem_veredito(resposta):
+    # Texto que segue adiante no plano, sem a linha de controle
+    return _LINHA_VEREDITO.sub("", resposta).strip()
+
+def agentes_para_reinvocar(vetos, dependencias):
+    # Quem vetou refaz, e quem produziu a entrada vetada precisa ajustar
+    alvo = set(vetos)
+    for agente in vetos:
+        alvo.update(dependencias[agente])
+    return alvo
@@ -0,0 +1,118 @@
+# contexto.py
+import re
+import threading
+from busca_plano import indice_do_plano
+from prompts import PROMPT_CHAT
+
+ORCAMENTO_TOKENS_PADRAO = 6000
+MAX_CHARS_DELTA = 400
+
+# Linhas que carregam decisões (vetos, trocas, ajustes) valem mais que o resto da fala
+_PADRAO_DECISAO = re.compile(r"\b(ok|vered|vet|aprov|trocar|troque|substitu|ajust|remov|evit|inclu)", re.IGNORECASE)
+
+def estimar_tokens(texto):
+    # Aproximação barata (~4 caracteres por token) para não depender do count_tokens da API
+    return len(texto) // 4 + 1
+
+def resumir_resposta(resposta, max_chars=MAX_CHARS_DELTA):
+    # Guarda a primeira linha e as linhas com decisões (inclusive o VEREDITO); o plano em si fica em outro lugar
+    linhas = [l.strip() for l in resposta.splitlines() if l.strip()]
+    if not linhas:
+        return ""
+    escolhidas = [linhas[0]] + [l for l in linhas[1:] if _PADRAO_DECISAO.search(l)]
+    resumo = " | ".join(escolhidas)
+    return resumo if len(resumo) <= max_chars else resumo[:max_chars - 3] + "..."
+
+class ContextoDebate:
+    # O orçamento de tokens é de melhor esforço: só o histórico (decisões anteriores) é cortado para caber.
+    # Persona, perfil, tarefa e plano atual vão sempre inteiros; se sozinhos já passam do orçamento,
+    # medir() apenas avisa.
+    def __init__(self, paciente, orcamento_tokens=ORCAMENTO_TOKENS_PADRAO):
+        self.paciente = paciente
+        self.orcamento_tokens = orcamento_tokens
+        self.deltas = []    # [(ciclo, agente, resumo)] das rodadas anteriores
+
+    def registrar_resposta(self, ciclo, agente, resposta):
+        self.deltas.append((ciclo, agente, resumir_resposta(resposta)))
+
+    def historico(self, persona, tarefa, falas_recentes=()):
+        # Monta o histórico cabendo no orçamento: perfil e tarefa (com o plano atual) sempre vão;
+        # os deltas mais antigos são descartados primeiro.
+        fixo = f"Paciente: {self.paciente}\n"
+        recentes = "".join(f"{agente}: {resumir_resposta(resp)}\n" for agente, resp in falas_recentes)
+        disponivel = self.orcamento_tokens - estimar_tokens(persona + tarefa + fixo + recentes)
+
+        linhas = []
+        for ciclo, agente, resumo in reversed(self.deltas):
+            linha = f"[Ciclo {ciclo}] {agente}: {resumo}\n"
+            custo = estimar_tokens(linha)
+            if custo > disponivel:
+                break
+            linhas.append(linha)
+            disponivel -= custo
+
+        anteriores = "Decisões anteriores:\n" + "".join(reversed(linhas)) if linhas else ""
+        return fixo + anteriores + recentes
+
+    def medir(self, ciclo, agente, *partes):
+        tokens = estimar_tokens("".join(partes))
+        if tokens > self.orcamento_tokens:
+            print(f"Aviso: prompt de {agente} (ciclo {ciclo}) com ~{tokens} tokens, acima do orçamento de {self.orcamento_tokens}")
+        return tokens
+
+class ContadorUso:
+    # Chamadas e tokens de uma execução do conselho; os agentes rodam em threads, daí o lock
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.chamadas = 0
+        self.tokens_entrada = 0
+        self.tokens_saida = 0
+        self.reaproveitadas = 0
+
+    def registrar_chamada(self, tokens_entrada, tokens_saida):
+        with self._lock:
+            self.chamadas += 1
+            self.tokens_entrada += tokens_entrada
+            self.tokens_saida += tokens_saida
+
+    def registrar_reaproveitada(self):
+        with self._lock:
+            self.reaproveitadas += 1
+
+    def resumo(self):
+        with self._lock:
+            return {"chamadas": self.chamadas, "tokens_entrada": self.tokens_entrada,
+                    "tokens_saida": self.tokens_saida, "reaproveitadas": self.reaproveitadas}
+
+# --- Chat do dashboard: trechos recuperados do plano + resumo curto das últimas falas ---
+
+MAX_TURNOS_CHAT = 3
+MAX_CHARS_FALA = 240
+TRECHOS_CHAT = 4
+MAX_TOKENS_TRECHOS = 700
+
+def resumo_conversa(historico, max_turnos=MAX_TURNOS_CHAT, max_chars=MAX_CHARS_FALA):
+    # Só as últimas trocas, cada fala cortada: o custo do histórico não cresce com a conversa
+    linhas = []
+    for msg in historico[-2 * max_turnos:]:
+        texto = " ".join(msg["content"].split())
+        if len(texto) > max_chars:
+            texto = texto[:max_chars - 3] + "..."
+        linhas.append(f"{'Usuário' if msg['role'] == 'user' else 'Assistente'}: {texto}")
+    return "\n".join(linhas)
+
+def prompt_chat(plano_texto, perfil, historico, pergunta, k=TRECHOS_CHAT):
+    # A pergunta anterior entra na busca para resolver continuações ("e no sábado?")
+    anteriores = [m["content"] for m in historico if m["role"] == "user"][-1:]
+    trechos, disponivel = [], MAX_TOKENS_TRECHOS
+    for trecho in indice_do_plano(plano_texto, perfil).buscar(" ".join(anteriores + [pergunta]), k):
+        if estimar_tokens(trecho) > disponivel:
+            break
+        trechos.append(trecho)
+        disponivel -= estimar_tokens(trecho)
+    partes = [PROMPT_CHAT, "--- TRECHOS DO PLANO E DO PERFIL ---", "\n\n".join(trechos) or "Nenhum trecho relevante."]
+    conversa = resumo_conversa(historico)
+    if conversa:
+        partes += ["--- CONVERSA RECENTE ---", conversa]
+    partes += ["--- PERGUNTA ---", pergunta]
+    return "\n".join(partes)
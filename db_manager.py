@@ -1,76 +1,665 @@
+import os
 import sqlite3
 import json
+import hashlib
+import queue
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import date, timedelta
+from rastreio import span, rastreado
+from plano_secoes import secoes_exatas, documento_das_secoes, diferenca, aplicar
 
 DB_NAME = "meu_time.db"
+TAMANHO_POOL = 8
 
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
+# WAL deixa leitores e o escritor trabalharem ao mesmo tempo entre sessões do Streamlit
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Campos do perfil que viram colunas consultáveis (o perfil completo continua em dados_json)
+CAMPOS_PERFIL = ("idade", "sexo", "peso", "altura", "objetivo_detalhado", "local_treino", "dias_treino")
+
+# Histórico de planos: snapshots comprimidos + deltas por seção (contra o snapshot, não em cadeia)
+MAX_DELTAS = 8
+# Retenção por usuário, aplicada a cada gravação: as últimas N versões (mais o snapshot em que elas se apoiam).
+# MPT_VERSOES_MANTIDAS=0 mantém todas (armazenamento passa a crescer com cada regeneração).
+MANTER_VERSOES = max(0, int(os.environ.get("MPT_VERSOES_MANTIDAS", 20))) or None
+
+# Hábitos do check-in diário (colunas de checkins e dos rollups)
+HABITOS = ("treino", "dieta", "sono")
+
+# SQL fixo: o sqlite3 reaproveita o statement preparado (cached_statements) a cada chamada.
+# Upsert mantém o id estável (INSERT OR REPLACE apagava a linha e órfãos ficavam em planos).
+SQL_SALVAR_USUARIO = f"""INSERT INTO usuarios (nome, dados_json, {", ".join(CAMPOS_PERFIL)})
+    VALUES (?, ?, {", ".join("?" for _ in CAMPOS_PERFIL)})
+    ON CONFLICT(nome) DO UPDATE SET dados_json = excluded.dados_json,
+        {", ".join(f"{c} = excluded.{c}" for c in CAMPOS_PERFIL)},
+        atualizado_em = CURRENT_TIMESTAMP
+    RETURNING id"""
+SQL_BUSCAR_USUARIO = "SELECT id, dados_json FROM usuarios WHERE nome = ?"
+SQL_LISTAR_USUARIOS = "SELECT nome FROM usuarios"
+SQL_SALVAR_PLANO = """INSERT INTO planos (usuario_id, tamanho, plano_hash, versao, tipo, base_id, conteudo)
+    VALUES (?, ?, ?, ?, ?, ?, ?)"""
+SQL_ULTIMA_VERSAO = "SELECT id, versao, tipo, base_id, plano_hash FROM planos WHERE usuario_id = ? ORDER BY id DESC LIMIT 1"
+# Apaga o que ficou além das últimas ?2 versões, menos os snapshots que servem de base para deltas mantidos
+SQL_PODAR_VERSOES = """DELETE FROM planos WHERE usuario_id = ?1
+    AND id < (SELECT id FROM planos WHERE usuario_id = ?1 ORDER BY id DESC LIMIT 1 OFFSET ?2 - 1)
+    AND id NOT IN (SELECT base_id FROM planos WHERE usuario_id = ?1 AND base_id IS NOT NULL)"""
+# PDF é cache da versão atual: as anteriores renderizam de novo se alguém pedir
+SQL_LIMPAR_PDFS = "UPDATE planos SET pdf = NULL WHERE usuario_id = ? AND id < ? AND pdf IS NOT NULL"
+SQL_BASE_VERSAO = "SELECT conteudo, (SELECT COUNT(*) FROM planos WHERE base_id = ?1) FROM planos WHERE id = ?1"
+# Qualquer versão sai de no máximo duas linhas: ela própria e o snapshot em que o delta se apoia
+SQL_LER_VERSAO = """SELECT p.id, p.plano_texto, p.tipo, p.conteudo, b.conteudo
+    FROM planos p LEFT JOIN planos b ON b.id = p.base_id"""
+SQL_PLANO_RECENTE = SQL_LER_VERSAO + " WHERE p.usuario_id = ? ORDER BY p.id DESC LIMIT 1"
+SQL_SALVAR_PDF = "UPDATE planos SET pdf = ? WHERE id = (SELECT MAX(id) FROM planos WHERE plano_hash = ?) AND pdf IS NULL"
+SQL_SALVAR_MENSAGEM = "INSERT INTO chat_mensagens (usuario_id, papel, conteudo, tokens_prompt) VALUES (?, ?, ?, ?)"
+SQL_LER_CHAT = "SELECT papel, conteudo FROM chat_mensagens WHERE usuario_id = ? ORDER BY id DESC LIMIT ?"
+
+# Conexão só de leitura para PRAGMA data_version: o valor muda a cada commit de qualquer outra conexão,
+# inclusive de outros processos (lote.py, workers). Caches de leitura (ex.: admin) usam como chave.
+_conexao_versao = None
+_versao_lock = threading.Lock()
+
+# Pool único por processo, compartilhado por todas as sessões
+_pool = queue.LifoQueue(maxsize=TAMANHO_POOL)
+
+def _nova_conexao():
+    # isolation_level=None: leituras em autocommit, escritas abrem transação explícita em transacao()
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False, isolation_level=None,
+                           cached_statements=128, timeout=5)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+@contextmanager
+def conexao():
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _nova_conexao()
+    try:
+        yield conn
+    finally:
+        # Conexão com transação ainda aberta (ROLLBACK falhou) não volta ao pool: travaria o próximo BEGIN
+        if conn.in_transaction:
+            conn.close()
+        else:
+            try:
+                _pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+@contextmanager
+def transacao():
+    # BEGIN IMMEDIATE pega o lock de escrita logo no início e evita deadlock de upgrade.
+    # O span inclui a espera pelo lock, que é onde a contenção entre workers aparece.
+    with span("db.transacao"), conexao() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            # Inclui COMMIT que falhou (ex.: SQLITE_BUSY): a transação continua aberta e precisa ser desfeita
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+def versao_dados():
+    global _conexao_versao
+    with _versao_lock:
+        if _conexao_versao is None or _conexao_versao[0] != DB_NAME:
+            _conexao_versao = (DB_NAME, sqlite3.connect(DB_NAME, check_same_thread=False))
+        return _conexao_versao[1].execute("PRAGMA data_version").fetchone()[0]
+
+# Migrações versionadas via PRAGMA user_version: cada função roda uma única vez, em ordem
+def _migracao_tabelas_base(conn):
     # Tabela de Usuários
-    c.execute('''CREATE TABLE IF NOT EXISTS usuarios (
+    conn.execute('''CREATE TABLE IF NOT EXISTS usuarios (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     nome TEXT UNIQUE,
                     dados_json TEXT
                 )''')
-    
+
     # Tabela de Planos
-    c.execute('''CREATE TABLE IF NOT EXISTS planos (
+    conn.execute('''CREATE TABLE IF NOT EXISTS planos (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     usuario_id INTEGER,
                     plano_texto TEXT,
                     data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY(usuario_id) REFERENCES usuarios(id)
                 )''')
-    
-    conn.commit()
-    conn.close()
 
+def _migracao_indice_planos(conn):
+    # Plano mais recente do usuário vira uma busca no índice, sem scan + sort
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_planos_usuario ON planos (usuario_id, id DESC)")
+
+def _migracao_colunas_perfil(conn):
+    tipos = {"idade": "INTEGER", "peso": "REAL", "altura": "REAL", "dias_treino": "INTEGER"}
+    for campo in CAMPOS_PERFIL:
+        conn.execute(f"ALTER TABLE usuarios ADD COLUMN {campo} {tipos.get(campo, 'TEXT')}")
+        conn.execute(f"UPDATE usuarios SET {campo} = json_extract(dados_json, '$.{campo}')")
+    conn.execute("ALTER TABLE usuarios ADD COLUMN atualizado_em TIMESTAMP")
+
+def _migracao_estatisticas_planos(conn):
+    # Tamanho guardado na escrita: média e listagem não precisam ler o texto do plano
+    conn.execute("ALTER TABLE planos ADD COLUMN tamanho INTEGER")
+    conn.execute("UPDATE planos SET tamanho = LENGTH(plano_texto)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_planos_data ON planos (data_criacao)")
+
+def _migracao_pdf_planos(conn):
+    # PDF renderizado fica junto do plano, localizado pelo hash do texto
+    conn.execute("ALTER TABLE planos ADD COLUMN plano_hash TEXT")
+    conn.execute("ALTER TABLE planos ADD COLUMN pdf BLOB")
+    hashes = [(hash_plano(texto or ""), id_) for id_, texto in conn.execute("SELECT id, plano_texto FROM planos").fetchall()]
+    conn.executemany("UPDATE planos SET plano_hash = ? WHERE id = ?", hashes)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_planos_hash ON planos (plano_hash)")
+
+def _migracao_fila_jobs(conn):
+    # Geração de planos em segundo plano: um job por anamnese, uma etapa (checkpoint) por fala de agente
+    conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dados_json TEXT,
+                    usar_cache INTEGER DEFAULT 1,
+                    status TEXT DEFAULT 'pendente',
+                    tentativas INTEGER DEFAULT 0,
+                    max_tentativas INTEGER DEFAULT 3,
+                    erro TEXT,
+                    usuario_id INTEGER,
+                    plano_texto TEXT,
+                    segundos_total REAL,
+                    criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)")
+    conn.execute('''CREATE TABLE IF NOT EXISTS job_etapas (
+                    job_id INTEGER,
+                    ciclo INTEGER,
+                    agente TEXT,
+                    resposta TEXT,
+                    segundos REAL,
+                    tokens_prompt INTEGER,
+                    concluido_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (job_id, ciclo, agente)
+                )''')
+
+def _migracao_uso_jobs(conn):
+    # Quantas chamadas ao LLM e tokens cada geração de plano consumiu
+    for coluna in ("chamadas_llm", "tokens_entrada", "tokens_saida"):
+        conn.execute(f"ALTER TABLE jobs ADD COLUMN {coluna} INTEGER")
+
+def _migracao_chat(conn):
+    # Histórico do chat por usuário; tokens_prompt registra o custo de cada pergunta enviada ao modelo
+    conn.execute('''CREATE TABLE IF NOT EXISTS chat_mensagens (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    usuario_id INTEGER,
+                    papel TEXT,
+                    conteudo TEXT,
+                    tokens_prompt INTEGER,
+                    criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_usuario ON chat_mensagens (usuario_id, id DESC)")
+
+def _migracao_lotes(conn):
+    # Jobs da geração em lote (lote.py): o par (lote, chave_lote) identifica cada perfil para retomar sem duplicar
+    conn.execute("ALTER TABLE jobs ADD COLUMN lote TEXT")
+    conn.execute("ALTER TABLE jobs ADD COLUMN chave_lote TEXT")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_lote ON jobs (lote, chave_lote)")
+
+def _migracao_versoes_planos(conn):
+    # Versões por usuário; linhas antigas mantêm plano_texto até a compactação convertê-las
+    for coluna, tipo in (("versao", "INTEGER"), ("tipo", "TEXT"), ("base_id", "INTEGER"), ("conteudo", "BLOB")):
+        conn.execute(f"ALTER TABLE planos ADD COLUMN {coluna} {tipo}")
+    conn.execute("""UPDATE planos SET versao = (SELECT COUNT(*) FROM planos p2
+                    WHERE p2.usuario_id = planos.usuario_id AND p2.id <= planos.id)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_planos_versao ON planos (usuario_id, versao)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_planos_base ON planos (base_id)")
+
+def _migracao_sequencias_com_habito(conn):
+    # Sequências passam a contar só dias com algum hábito: refaz os intervalos a partir de checkin_dias
+    # (ilhas de dias seguidos: data - posição é constante dentro de cada ilha)
+    conn.execute("DELETE FROM checkin_sequencias")
+    conn.execute("""INSERT INTO checkin_sequencias (usuario_id, inicio, fim)
+                    SELECT usuario_id, MIN(data), MAX(data) FROM (
+                        SELECT usuario_id, data,
+                               julianday(data) - ROW_NUMBER() OVER (PARTITION BY usuario_id ORDER BY data) AS ilha
+                        FROM checkin_dias WHERE treino OR dieta OR sono)
+                    GROUP BY usuario_id, ilha""")
+    conn.execute("UPDATE checkin_resumo SET melhor_sequencia = (" +
+                 SQL_MELHOR_SEQUENCIA.replace("usuario_id = ?", "usuario_id = checkin_resumo.usuario_id") + ")")
+
+def _migracao_backoff_jobs(conn):
+    # Epoch a partir do qual um job que falhou pode ser pego de novo (backoff entre tentativas)
+    conn.execute("ALTER TABLE jobs ADD COLUMN disponivel_em REAL DEFAULT 0")
+
+def _migracao_checkins(conn):
+    # checkins é só de inserção (uma linha por envio; o último do dia vale). Os rollups são atualizados
+    # na mesma transação da escrita, então o painel nunca precisa varrer o histórico.
+    conn.execute('''CREATE TABLE IF NOT EXISTS checkins (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    usuario_id INTEGER,
+                    data TEXT,
+                    treino INTEGER, dieta INTEGER, sono INTEGER,
+                    criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_checkins_usuario ON checkins (usuario_id, data, id)")
+    # Estado vigente de cada dia: permite corrigir um dia aplicando só a diferença nos rollups
+    conn.execute('''CREATE TABLE IF NOT EXISTS checkin_dias (
+                    usuario_id INTEGER, data TEXT, treino INTEGER, dieta INTEGER, sono INTEGER,
+                    PRIMARY KEY (usuario_id, data)
+                ) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS checkin_semanas (
+                    usuario_id INTEGER, semana TEXT, dias INTEGER, treino INTEGER, dieta INTEGER, sono INTEGER,
+                    PRIMARY KEY (usuario_id, semana)
+                ) WITHOUT ROWID''')
+    # Sequências como intervalos de dias seguidos: um dia novo estende, cria ou une intervalos vizinhos
+    conn.execute('''CREATE TABLE IF NOT EXISTS checkin_sequencias (
+                    usuario_id INTEGER, inicio TEXT, fim TEXT,
+                    PRIMARY KEY (usuario_id, inicio)
+                ) WITHOUT ROWID''')
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_sequencias_fim ON checkin_sequencias (usuario_id, fim)")
+    conn.execute('''CREATE TABLE IF NOT EXISTS checkin_resumo (
+                    usuario_id INTEGER PRIMARY KEY, dias INTEGER, treino INTEGER, dieta INTEGER, sono INTEGER,
+                    melhor_sequencia INTEGER
+                )''')
+
+MIGRACOES = [
+    _migracao_tabelas_base,
+    _migracao_indice_planos,
+    _migracao_colunas_perfil,
+    _migracao_estatisticas_planos,
+    _migracao_pdf_planos,
+    _migracao_fila_jobs,
+    _migracao_uso_jobs,
+    _migracao_chat,
+    _migracao_lotes,
+    _migracao_versoes_planos,
+    _migracao_checkins,
+    _migracao_backoff_jobs,
+    _migracao_sequencias_com_habito,
+]
+
+@rastreado("db.init_db")
+def init_db():
+    # Roda a cada rerun do Streamlit: sem migração pendente, não pega o lock de escrita
+    with conexao() as conn:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRACOES):
+            return
+    with transacao() as conn:
+        # Relê dentro da transação: outro processo pode ter migrado entre a leitura e o BEGIN
+        versao = conn.execute("PRAGMA user_version").fetchone()[0]
+        for numero, migracao in enumerate(MIGRACOES[versao:], start=versao + 1):
+            migracao(conn)
+            conn.execute(f"PRAGMA user_version = {numero}")
+
+def hash_plano(plano_texto):
+    return hashlib.sha256(plano_texto.encode("utf-8")).hexdigest()
+
+def _parametros_usuario(dados):
+    return (dados.get('nome'), json.dumps(dados)) + tuple(dados.get(c) for c in CAMPOS_PERFIL)
+
+@rastreado("db.salvar_usuario")
 def salvar_usuario(dados):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    nome = dados.get('nome')
-    dados_json = json.dumps(dados)
-    
     try:
-        # Tenta inserir, se já existe atualiza
-        c.execute("INSERT OR REPLACE INTO usuarios (nome, dados_json) VALUES (?, ?)", (nome, dados_json))
-        conn.commit()
+        # Tenta inserir, se já existe atualiza (mantendo o id)
+        with transacao() as conn:
+            return conn.execute(SQL_SALVAR_USUARIO, _parametros_usuario(dados)).fetchone()[0]
     except Exception as e:
         print(f"Erro ao salvar usuario: {e}")
-    finally:
-        conn.close()
 
+def _comprimir(secoes):
+    return zlib.compress(json.dumps(secoes, ensure_ascii=False).encode("utf-8"), 6)
+
+def _descomprimir(blob):
+    return json.loads(zlib.decompress(blob))
+
+def _texto_da_linha(plano_texto, tipo, conteudo, conteudo_base):
+    if plano_texto is not None:
+        return plano_texto  # linha anterior ao versionamento, ainda não compactada
+    secoes = _descomprimir(conteudo)
+    if tipo == "delta":
+        secoes = aplicar(_descomprimir(conteudo_base), secoes)
+    return documento_das_secoes(secoes)
+
+def _codificar(secoes, base, deltas_na_base):
+    # Delta só enquanto for bem menor que um snapshot novo e a base não tiver deltas demais
+    snapshot = _comprimir(secoes)
+    if base is not None and deltas_na_base < MAX_DELTAS:
+        delta = _comprimir(diferenca(base, secoes))
+        if len(delta) < len(snapshot) // 2:
+            return "delta", delta
+    return "snapshot", snapshot
+
+def gravar_plano(conn, usuario_id, plano_texto):
+    plano_hash = hash_plano(plano_texto)
+    ultima = conn.execute(SQL_ULTIMA_VERSAO, (usuario_id,)).fetchone()
+    if ultima and ultima[4] == plano_hash:
+        return  # regeneração idêntica à versão atual: nada a guardar
+    secoes = secoes_exatas(plano_texto)
+    versao = (ultima[1] or 0) + 1 if ultima else 1
+    base_id, base, deltas_na_base = None, None, 0
+    if ultima and ultima[2]:
+        base_id = ultima[0] if ultima[2] == "snapshot" else ultima[3]
+        conteudo_base, deltas_na_base = conn.execute(SQL_BASE_VERSAO, (base_id,)).fetchone()
+        base = _descomprimir(conteudo_base)
+    tipo, conteudo = _codificar(secoes, base, deltas_na_base)
+    plano_id = conn.execute(SQL_SALVAR_PLANO, (usuario_id, len(plano_texto), plano_hash, versao, tipo,
+                                               base_id if tipo == "delta" else None, conteudo)).lastrowid
+    conn.execute(SQL_LIMPAR_PDFS, (usuario_id, plano_id))
+    if MANTER_VERSOES:
+        conn.execute(SQL_PODAR_VERSOES, (usuario_id, MANTER_VERSOES))
+
+def _compactar_usuario(conn, usuario_id, manter):
+    # manter=None: nenhuma versão é apagada, só recodificada (linhas antigas viram snapshot/delta)
+    linhas = conn.execute(SQL_LER_VERSAO + " WHERE p.usuario_id = ? ORDER BY p.id", (usuario_id,)).fetchall()
+    descartadas = linhas[:-manter] if manter else []
+    mantidas = linhas[len(descartadas):]
+    # Textos reconstruídos antes de apagar: a base de um delta mantido pode estar entre as descartadas
+    textos = [(linha[0], _texto_da_linha(*linha[1:])) for linha in mantidas]
+    conn.executemany("DELETE FROM planos WHERE id = ?", [(linha[0],) for linha in descartadas])
+    base_id, base, deltas = None, None, 0
+    for plano_id, texto in textos:
+        secoes = secoes_exatas(texto)
+        tipo, conteudo = _codificar(secoes, base, deltas)
+        if tipo == "snapshot":
+            base_id, base, deltas = plano_id, secoes, 0
+        else:
+            deltas += 1
+        conn.execute("UPDATE planos SET plano_texto = NULL, tipo = ?, base_id = ?, conteudo = ? WHERE id = ?",
+                     (tipo, base_id if tipo == "delta" else None, conteudo, plano_id))
+    if textos:
+        conn.execute(SQL_LIMPAR_PDFS, (usuario_id, textos[-1][0]))
+    return len(linhas) - len(mantidas)
+
+def gravar_usuario_e_plano(conn, dados, plano_texto):
+    # Versão que roda dentro de uma transação já aberta por quem chama
+    usuario_id = conn.execute(SQL_SALVAR_USUARIO, _parametros_usuario(dados)).fetchone()[0]
+    gravar_plano(conn, usuario_id, plano_texto)
+    return usuario_id
+
+@rastreado("db.salvar_usuario_e_plano")
+def salvar_usuario_e_plano(dados, plano_texto):
+    # Usuário e plano numa única transação: o id sai do próprio INSERT, sem reconsultar
+    with transacao() as conn:
+        return gravar_usuario_e_plano(conn, dados, plano_texto)
+
+@rastreado("db.buscar_usuario")
 def buscar_usuario(nome):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT id, dados_json FROM usuarios WHERE nome = ?", (nome,))
-    result = c.fetchone()
-    conn.close()
-    
+    with conexao() as conn:
+        result = conn.execute(SQL_BUSCAR_USUARIO, (nome,)).fetchone()
+
     if result:
         return result[0], json.loads(result[1])
     return None, None
 
+@rastreado("db.listar_usuarios")
 def listar_usuarios():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT nome FROM usuarios")
-    usuarios = [row[0] for row in c.fetchall()]
-    conn.close()
-    return usuarios
+    with conexao() as conn:
+        return [row[0] for row in conn.execute(SQL_LISTAR_USUARIOS)]
 
+@rastreado("db.salvar_plano")
 def salvar_plano(usuario_id, plano_texto):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("INSERT INTO planos (usuario_id, plano_texto) VALUES (?, ?)", (usuario_id, plano_texto))
-    conn.commit()
-    conn.close()
+    with transacao() as conn:
+        gravar_plano(conn, usuario_id, plano_texto)
 
+@rastreado("db.salvar_planos")
+def salvar_planos(itens):
+    # Escrita em lote: [(usuario_id, plano_texto), ...] num único commit
+    with transacao() as conn:
+        for usuario_id, texto in itens:
+            gravar_plano(conn, usuario_id, texto)
+
+@rastreado("db.ler_plano_recente")
 def ler_plano_recente(usuario_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT plano_texto FROM planos WHERE usuario_id = ? ORDER BY id DESC LIMIT 1", (usuario_id,))
-    result = c.fetchone()
-    conn.close()
+    with conexao() as conn:
+        result = conn.execute(SQL_PLANO_RECENTE, (usuario_id,)).fetchone()
+    return _texto_da_linha(*result[1:]) if result else None
+
+@rastreado("db.listar_versoes")
+def listar_versoes(usuario_id):
+    # Metadados do histórico, mais recente primeiro, sem descomprimir nada
+    with conexao() as conn:
+        rows = conn.execute("""SELECT id, versao, data_criacao, tamanho FROM planos
+                               WHERE usuario_id = ? ORDER BY id DESC""", (usuario_id,))
+        colunas = [c[0] for c in rows.description]
+        return [dict(zip(colunas, r)) for r in rows]
+
+@rastreado("db.ler_versao")
+def ler_versao(usuario_id, versao):
+    with conexao() as conn:
+        result = conn.execute(SQL_LER_VERSAO + " WHERE p.usuario_id = ? AND p.versao = ?", (usuario_id, versao)).fetchone()
+    return _texto_da_linha(*result[1:]) if result else None
+
+@rastreado("db.compactar_planos")
+def compactar_planos(manter=MANTER_VERSOES):
+    # Compactação completa: converte linhas antigas em snapshot/delta, limpa checkpoints e textos de jobs
+    # já concluídos e apaga as versões além das últimas `manter` de cada usuário (None mantém todas).
+    # Uma transação por usuário, para não segurar o lock de escrita por muito tempo.
+    with conexao() as conn:
+        usuarios = [r[0] for r in conn.execute(
+            """SELECT usuario_id FROM planos GROUP BY usuario_id
+               HAVING (? IS NOT NULL AND COUNT(*) > ?) OR SUM(plano_texto IS NOT NULL) > 0""", (manter, manter))]
+        antes = _bytes_planos(conn)
+    removidas = 0
+    for usuario_id in usuarios:
+        with transacao() as conn:
+            removidas += _compactar_usuario(conn, usuario_id, manter)
+    with transacao() as conn:
+        conn.execute("""DELETE FROM job_etapas WHERE job_id IN
+                        (SELECT id FROM jobs WHERE status = 'concluido' AND atualizado_em < datetime('now', '-1 day'))""")
+        conn.execute("""UPDATE jobs SET plano_texto = NULL
+                        WHERE status = 'concluido' AND plano_texto IS NOT NULL AND atualizado_em < datetime('now', '-1 day')""")
+    with conexao() as conn:
+        depois = _bytes_planos(conn)
+    return {"usuarios": len(usuarios), "versoes_removidas": removidas, "bytes_antes": antes, "bytes_depois": depois}
+
+def _bytes_planos(conn):
+    return conn.execute("""SELECT COALESCE(SUM(COALESCE(LENGTH(CAST(plano_texto AS BLOB)), 0) +
+                                              COALESCE(LENGTH(conteudo), 0) + COALESCE(LENGTH(pdf), 0)), 0)
+                           FROM planos""").fetchone()[0]
+
+@rastreado("db.salvar_mensagens_chat")
+def salvar_mensagens_chat(usuario_id, mensagens):
+    # [(papel, conteudo, tokens_prompt), ...]: pergunta e resposta do turno num único commit
+    with transacao() as conn:
+        conn.executemany(SQL_SALVAR_MENSAGEM, ((usuario_id, papel, conteudo, tokens) for papel, conteudo, tokens in mensagens))
+
+@rastreado("db.ler_chat")
+def ler_chat(usuario_id, limite=100):
+    # Últimas mensagens em ordem cronológica, no formato do st.session_state.chat_history
+    with conexao() as conn:
+        rows = conn.execute(SQL_LER_CHAT, (usuario_id, limite)).fetchall()
+    return [{"role": papel, "content": conteudo} for papel, conteudo in reversed(rows)]
+
+# --- Check-ins diários e rollups incrementais ---
+
+def _semana(dia):
+    return (dia - timedelta(days=dia.weekday())).isoformat()
+
+def _estender_sequencias(conn, usuario_id, dia):
+    # Dia novo: junta com o intervalo que termina ontem e/ou o que começa amanhã; devolve o tamanho resultante
+    antes = conn.execute("SELECT inicio FROM checkin_sequencias WHERE usuario_id = ? AND fim = ?",
+                         (usuario_id, (dia - timedelta(days=1)).isoformat())).fetchone()
+    depois = conn.execute("SELECT fim FROM checkin_sequencias WHERE usuario_id = ? AND inicio = ?",
+                          (usuario_id, (dia + timedelta(days=1)).isoformat())).fetchone()
+    inicio = antes[0] if antes else dia.isoformat()
+    fim = depois[0] if depois else dia.isoformat()
+    if depois:
+        conn.execute("DELETE FROM checkin_sequencias WHERE usuario_id = ? AND inicio = ?",
+                     (usuario_id, (dia + timedelta(days=1)).isoformat()))
+    conn.execute("""INSERT INTO checkin_sequencias (usuario_id, inicio, fim) VALUES (?, ?, ?)
+                    ON CONFLICT(usuario_id, inicio) DO UPDATE SET fim = excluded.fim""", (usuario_id, inicio, fim))
+    return (date.fromisoformat(fim) - date.fromisoformat(inicio)).days + 1
+
+def _encurtar_sequencias(conn, usuario_id, dia):
+    # Dia que deixou de contar (correção sem nenhum hábito): parte o intervalo que o contém em dois
+    intervalo = conn.execute("""SELECT inicio, fim FROM checkin_sequencias
+                                WHERE usuario_id = ? AND inicio <= ? AND fim >= ?""",
+                             (usuario_id, dia.isoformat(), dia.isoformat())).fetchone()
+    if not intervalo:
+        return
+    inicio, fim = intervalo
+    conn.execute("DELETE FROM checkin_sequencias WHERE usuario_id = ? AND inicio = ?", (usuario_id, inicio))
+    if inicio < dia.isoformat():
+        conn.execute("INSERT INTO checkin_sequencias (usuario_id, inicio, fim) VALUES (?, ?, ?)",
+                     (usuario_id, inicio, (dia - timedelta(days=1)).isoformat()))
+    if fim > dia.isoformat():
+        conn.execute("INSERT INTO checkin_sequencias (usuario_id, inicio, fim) VALUES (?, ?, ?)",
+                     (usuario_id, (dia + timedelta(days=1)).isoformat(), fim))
+
+SQL_MELHOR_SEQUENCIA = """SELECT COALESCE(CAST(MAX(julianday(fim) - julianday(inicio)) AS INTEGER) + 1, 0)
+                          FROM checkin_sequencias WHERE usuario_id = ?"""
+
+@rastreado("db.registrar_checkin")
+def registrar_checkin(usuario_id, dia, habitos):
+    # habitos: {"treino": bool, ...}. Corrigir um dia já registrado só aplica a diferença nos rollups.
+    novos = tuple(int(bool(habitos.get(h))) for h in HABITOS)
+    with transacao() as conn:
+        conn.execute("INSERT INTO checkins (usuario_id, data, treino, dieta, sono) VALUES (?, ?, ?, ?, ?)",
+                     (usuario_id, dia.isoformat(), *novos))
+        antigo = conn.execute("SELECT treino, dieta, sono FROM checkin_dias WHERE usuario_id = ? AND data = ?",
+                              (usuario_id, dia.isoformat())).fetchone()
+        conn.execute("INSERT OR REPLACE INTO checkin_dias (usuario_id, data, treino, dieta, sono) VALUES (?, ?, ?, ?, ?)",
+                     (usuario_id, dia.isoformat(), *novos))
+        dia_novo = int(antigo is None)
+        delta = [n - a for n, a in zip(novos, antigo or (0, 0, 0))]
+        conn.execute("""INSERT INTO checkin_semanas (usuario_id, semana, dias, treino, dieta, sono) VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(usuario_id, semana) DO UPDATE SET dias = dias + excluded.dias,
+                            treino = treino + excluded.treino, dieta = dieta + excluded.dieta, sono = sono + excluded.sono""",
+                     (usuario_id, _semana(dia), dia_novo, *delta))
+        # Só dias com pelo menos um hábito cumprido entram na sequência
+        contava, conta = antigo is not None and any(antigo), any(novos)
+        sequencia = _estender_sequencias(conn, usuario_id, dia) if conta and not contava else 0
+        if contava and not conta:
+            _encurtar_sequencias(conn, usuario_id, dia)
+        conn.execute("""INSERT INTO checkin_resumo (usuario_id, dias, treino, dieta, sono, melhor_sequencia)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(usuario_id) DO UPDATE SET dias = dias + excluded.dias,
+                            treino = treino + excluded.treino, dieta = dieta + excluded.dieta, sono = sono + excluded.sono,
+                            melhor_sequencia = MAX(melhor_sequencia, excluded.melhor_sequencia)""",
+                     (usuario_id, dia_novo, *delta, sequencia))
+        if contava and not conta:
+            # Raro (desmarcar um dia inteiro): a melhor sequência pode ter encolhido, recalcula pelos intervalos
+            conn.execute("UPDATE checkin_resumo SET melhor_sequencia = (" + SQL_MELHOR_SEQUENCIA + ") WHERE usuario_id = ?",
+                         (usuario_id, usuario_id))
+
+@rastreado("db.ler_checkin")
+def ler_checkin(usuario_id, dia):
+    with conexao() as conn:
+        result = conn.execute("SELECT treino, dieta, sono FROM checkin_dias WHERE usuario_id = ? AND data = ?",
+                              (usuario_id, dia.isoformat())).fetchone()
+    return dict(zip(HABITOS, map(bool, result))) if result else None
+
+@rastreado("db.progresso_checkins")
+def progresso_checkins(usuario_id, semanas=26, hoje=None):
+    # Tudo sai dos rollups por chave primária: custo constante, não importa quantos anos de check-ins existam
+    hoje = hoje or date.today()
+    with conexao() as conn:
+        resumo = conn.execute("SELECT dias, treino, dieta, sono, melhor_sequencia FROM checkin_resumo WHERE usuario_id = ?",
+                              (usuario_id,)).fetchone()
+        ultima = conn.execute("""SELECT inicio, fim FROM checkin_sequencias WHERE usuario_id = ?
+                                 ORDER BY fim DESC LIMIT 1""", (usuario_id,)).fetchone()
+        por_semana = conn.execute("""SELECT semana, dias, treino, dieta, sono FROM checkin_semanas
+                                     WHERE usuario_id = ? AND semana >= ? ORDER BY semana""",
+                                  (usuario_id, _semana(hoje - timedelta(weeks=semanas - 1)))).fetchall()
+    if not resumo:
+        return None
+    dias, treino, dieta, sono, melhor = resumo
+    atual = 0
+    # A sequência atual continua valendo até o fim do dia seguinte ao último check-in
+    if ultima and date.fromisoformat(ultima[1]) >= hoje - timedelta(days=1):
+        atual = (date.fromisoformat(ultima[1]) - date.fromisoformat(ultima[0])).days + 1
+    return {"dias": dias, "sequencia_atual": atual, "melhor_sequencia": melhor,
+            "taxas": {h: v / dias for h, v in zip(HABITOS, (treino, dieta, sono))},
+            "semanas": [{"semana": sem, "dias": d,
+                         **{h: v / _dias_da_semana(sem, hoje) for h, v in zip(HABITOS, valores)}}
+                        for sem, d, *valores in por_semana]}
+
+def _dias_da_semana(semana, hoje):
+    # Semanas passadas valem 7 dias; a atual, só os dias já transcorridos
+    return max(1, min(7, (hoje - date.fromisoformat(semana)).days + 1))
+
+# --- Consultas do admin: paginação por cursor (keyset) e projeção sem o texto do plano ---
+
+@rastreado("db.listar_usuarios_pagina")
+def listar_usuarios_pagina(apos_id=0, busca="", limite=50):
+    with conexao() as conn:
+        rows = conn.execute(
+            f"""SELECT id, nome, {", ".join(CAMPOS_PERFIL)}, atualizado_em FROM usuarios
+                WHERE id > ? AND nome LIKE ? ORDER BY id LIMIT ?""",
+            (apos_id, f"%{busca}%", limite))
+        colunas = [c[0] for c in rows.description]
+        return [dict(zip(colunas, r)) for r in rows]
+
+@rastreado("db.listar_planos_pagina")
+def listar_planos_pagina(antes_id=None, busca="", desde=None, ate=None, limite=50):
+    filtros, params = ["p.id < ?"], [antes_id if antes_id is not None else 2**63 - 1]
+    if busca:
+        filtros.append("u.nome LIKE ?"); params.append(f"%{busca}%")
+    if desde:
+        filtros.append("p.data_criacao >= ?"); params.append(str(desde))
+    if ate:
+        filtros.append("p.data_criacao < date(?, '+1 day')"); params.append(str(ate))
+    with conexao() as conn:
+        rows = conn.execute(
+            f"""SELECT p.id, p.usuario_id, u.nome, p.data_criacao, p.tamanho
+                FROM planos p LEFT JOIN usuarios u ON u.id = p.usuario_id
+                WHERE {" AND ".join(filtros)} ORDER BY p.id DESC LIMIT ?""",
+            (*params, limite))
+        colunas = [c[0] for c in rows.description]
+        return [dict(zip(colunas, r)) for r in rows]
+
+@rastreado("db.buscar_pdf")
+def buscar_pdf(plano_hash):
+    with conexao() as conn:
+        result = conn.execute("SELECT pdf FROM planos WHERE plano_hash = ? AND pdf IS NOT NULL LIMIT 1", (plano_hash,)).fetchone()
     return result[0] if result else None
+
+@rastreado("db.salvar_pdf")
+def salvar_pdf(plano_hash, pdf_bytes):
+    # Só grava se o plano já existe no banco; planos não salvos ficam no memo da sessão
+    with transacao() as conn:
+        conn.execute(SQL_SALVAR_PDF, (pdf_bytes, plano_hash))
+
+def gravar_pdfs(conn, itens):
+    # [(plano_hash, pdf_bytes), ...] dentro de uma transação já aberta (escrita em lote)
+    conn.executemany(SQL_SALVAR_PDF, ((pdf_bytes, plano_hash) for plano_hash, pdf_bytes in itens))
+
+@rastreado("db.ler_plano")
+def ler_plano(plano_id):
+    with conexao() as conn:
+        result = conn.execute(SQL_LER_VERSAO + " WHERE p.id = ?", (plano_id,)).fetchone()
+    return _texto_da_linha(*result[1:]) if result else None
+
+@rastreado("db.estatisticas_admin")
+def estatisticas_admin(dias=30):
+    with conexao() as conn:
+        usuarios = conn.execute("SELECT COUNT(*) FROM usuarios").fetchone()[0]
+        planos, media = conn.execute("SELECT COUNT(*), AVG(tamanho) FROM planos").fetchone()
+        armazenado = _bytes_planos(conn)
+        por_dia = conn.execute(
+            """SELECT date(data_criacao) AS dia, COUNT(*) FROM planos
+               WHERE data_criacao >= date('now', ?) GROUP BY dia ORDER BY dia""",
+            (f"-{dias} days",)).fetchall()
+    return {"usuarios": usuarios, "planos": planos, "tamanho_medio": media or 0, "planos_por_dia": por_dia,
+            "bytes_armazenados": armazenado}
+
+if __name__ == "__main__":
+    # Uso: python db_manager.py --compactar [--manter N]
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--compactar", action="store_true", help="recodifica o histórico de planos e limpa jobs antigos")
+    parser.add_argument("--manter", type=int, default=MANTER_VERSOES,
+                        help="apaga as versões além das últimas N de cada usuário (0 mantém todas)")
+    args = parser.parse_args()
+    init_db()
+    if args.compactar:
+        r = compactar_planos(args.manter or None)
+        print(f"{r['usuarios']} usuários compactados · {r['versoes_removidas']} versões removidas · "
+              f"{r['bytes_antes'] / 1024:.0f} KB -> {r['bytes_depois'] / 1024:.0f} KB")
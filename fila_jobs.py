@@ -0,0 +1,190 @@
+# fila_jobs.py
+import json
+import os
+import random
+import threading
+import time
+from db_manager import conexao, transacao, gravar_usuario_e_plano, hash_plano
+
+# Cada worker é uma thread do processo: as chamadas ao Gemini são I/O, então threads bastam.
+# Poucos e fixos: o limite real é a cota da API, não a CPU, e cada worker disputa o lock de escrita do SQLite.
+NUM_WORKERS = max(1, int(os.environ.get("MPT_WORKERS", 2)))
+INTERVALO_POLL = 1.0
+# Backoff entre tentativas de um job: 10s, 20s, 40s... até 5 min, com jitter
+ESPERA_BASE_JOB = 10.0
+ESPERA_MAXIMA_JOB = 300.0
+
+_novo_job = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+_parciais = {}  # job_id -> {agente: texto parcial em streaming}; só em memória
+
+def enfileirar(dados, usar_cache=True, max_tentativas=3):
+    with transacao() as conn:
+        job_id = conn.execute("INSERT INTO jobs (dados_json, usar_cache, max_tentativas) VALUES (?, ?, ?)",
+                              (json.dumps(dados), int(usar_cache), max_tentativas)).lastrowid
+    _novo_job.set()
+    return job_id
+
+def enfileirar_lote(lote, perfis, usar_cache=True, max_tentativas=3, refazer_falhas=False):
+    # Um job por perfil, identificado pelo hash do perfil dentro do lote: rodar o mesmo arquivo de novo
+    # não duplica nada, só retoma o que ficou pendente (jobs interrompidos no meio voltam para a fila)
+    linhas = [(json.dumps(d), int(usar_cache), max_tentativas, lote, hash_plano(json.dumps(d, sort_keys=True)))
+              for d in perfis]
+    with transacao() as conn:
+        conn.execute("UPDATE jobs SET status = 'pendente' WHERE lote = ? AND status = 'executando'", (lote,))
+        if refazer_falhas:
+            conn.execute("""UPDATE jobs SET status = 'pendente', tentativas = 0, erro = NULL, disponivel_em = 0
+                            WHERE lote = ? AND status = 'falhou'""", (lote,))
+        conn.executemany("""INSERT OR IGNORE INTO jobs (dados_json, usar_cache, max_tentativas, lote, chave_lote)
+                            VALUES (?, ?, ?, ?, ?)""", linhas)
+        return dict(conn.execute("SELECT status, COUNT(*) FROM jobs WHERE lote = ? GROUP BY status", (lote,)).fetchall())
+
+def reenfileirar(job_id):
+    # Recoloca um job que falhou; os checkpoints ficam, então ele continua do último agente concluído
+    with transacao() as conn:
+        conn.execute("""UPDATE jobs SET status = 'pendente', tentativas = 0, erro = NULL, disponivel_em = 0,
+                               atualizado_em = CURRENT_TIMESTAMP WHERE id = ? AND status = 'falhou'""", (job_id,))
+    _novo_job.set()
+
+def status_job(job_id):
+    with conexao() as conn:
+        row = conn.execute("""SELECT status, tentativas, max_tentativas, erro, plano_texto, segundos_total,
+                                     chamadas_llm, tokens_entrada, tokens_saida, usuario_id
+                              FROM jobs WHERE id = ?""", (job_id,)).fetchone()
+        if row is None:
+            return None
+        etapas = conn.execute("""SELECT ciclo, agente, resposta, segundos, tokens_prompt FROM job_etapas
+                                 WHERE job_id = ? ORDER BY rowid""", (job_id,)).fetchall()
+    status, tentativas, max_tentativas, erro, plano_texto, segundos_total, chamadas, entrada, saida, usuario_id = row
+    return {"status": status, "tentativas": tentativas, "max_tentativas": max_tentativas, "erro": erro,
+            "plano_texto": plano_texto, "segundos_total": segundos_total, "etapas": etapas,
+            "chamadas_llm": chamadas, "tokens_entrada": entrada, "tokens_saida": saida,
+            "usuario_id": usuario_id, "parciais": dict(_parciais.get(job_id, {}))}
+
+def _checkpoints(job_id):
+    with conexao() as conn:
+        rows = conn.execute("SELECT ciclo, agente, resposta FROM job_etapas WHERE job_id = ?", (job_id,))
+        return {(ciclo, agente): resposta for ciclo, agente, resposta in rows}
+
+def pegar_job(lote=None):
+    # UPDATE ... RETURNING dentro de BEGIN IMMEDIATE: dois workers nunca pegam o mesmo job.
+    # "lote IS ?" separa a fila do app (lote NULL) das execuções em lote da linha de comando.
+    # Jobs em backoff (disponivel_em no futuro) ficam na fila até a hora deles.
+    agora = time.time()
+    # Leitura barata antes: worker ocioso não pega o lock de escrita a cada poll com a fila vazia
+    with conexao() as conn:
+        if conn.execute("""SELECT 1 FROM jobs WHERE status = 'pendente' AND lote IS ? AND disponivel_em <= ?
+                           LIMIT 1""", (lote, agora)).fetchone() is None:
+            return None
+    with transacao() as conn:
+        return conn.execute("""UPDATE jobs SET status = 'executando', tentativas = tentativas + 1,
+                                      atualizado_em = CURRENT_TIMESTAMP
+                               WHERE id = (SELECT id FROM jobs WHERE status = 'pendente' AND lote IS ?
+                                           AND disponivel_em <= ? ORDER BY id LIMIT 1)
+                               RETURNING id, dados_json, usar_cache, tentativas, max_tentativas""",
+                            (lote, agora)).fetchone()
+
+def proximo_job_em(lote=None):
+    # Epoch do próximo job pendente em backoff (None se não há pendentes)
+    with conexao() as conn:
+        return conn.execute("SELECT MIN(disponivel_em) FROM jobs WHERE status = 'pendente' AND lote IS ?",
+                            (lote,)).fetchone()[0]
+
+def _observador_job(job_id, checkpoints):
+    from agentes import ObservadorConselho
+
+    class ObservadorJob(ObservadorConselho):
+        def agente_parcial(self, ciclo, nome, texto):
+            _parciais.setdefault(job_id, {})[nome] = texto
+
+        def agente_concluiu(self, ciclo, nome, resposta, segundos, tokens_prompt):
+            _parciais.get(job_id, {}).pop(nome, None)
+            if (ciclo, nome) in checkpoints:
+                return
+            with transacao() as conn:
+                conn.execute("""INSERT OR REPLACE INTO job_etapas (job_id, ciclo, agente, resposta, segundos, tokens_prompt)
+                                VALUES (?, ?, ?, ?, ?, ?)""", (job_id, ciclo, nome, resposta, segundos, tokens_prompt))
+
+        def fim(self, uso):
+            with transacao() as conn:
+                conn.execute("UPDATE jobs SET chamadas_llm = ?, tokens_entrada = ?, tokens_saida = ? WHERE id = ?",
+                             (uso["chamadas"], uso["tokens_entrada"], uso["tokens_saida"], job_id))
+
+    return ObservadorJob()
+
+def rodar_conselho(job, fabrica_modelo):
+    # Roda o conselho de um job já pego, retomando dos checkpoints; devolve (dados, plano)
+    from agentes import simular_agentes
+    job_id, dados_json, usar_cache = job[:3]
+    dados = json.loads(dados_json)
+    try:
+        model = fabrica_modelo()
+        if model is None:
+            raise RuntimeError("API do Google não configurada.")
+        checkpoints = _checkpoints(job_id)
+        plano = simular_agentes(dados, model, usar_cache=bool(usar_cache),
+                                observador=_observador_job(job_id, checkpoints), checkpoints=checkpoints)
+    finally:
+        _parciais.pop(job_id, None)
+    return dados, plano
+
+def marcar_concluido(conn, job_id, dados, plano, segundos):
+    usuario_id = gravar_usuario_e_plano(conn, dados, plano)
+    conn.execute("""UPDATE jobs SET status = 'concluido', plano_texto = ?, usuario_id = ?, segundos_total = ?,
+                           erro = NULL, atualizado_em = CURRENT_TIMESTAMP WHERE id = ?""",
+                 (plano, usuario_id, segundos, job_id))
+    return usuario_id
+
+def registrar_falha(job, erro):
+    # Volta para a fila com backoff enquanto houver tentativas; depois fica como 'falhou'.
+    # Circuito aberto não é falha do job: não gasta tentativa e ele espera o circuito fechar.
+    from limitador import CircuitoAberto
+    job_id, _, _, tentativas, max_tentativas = job
+    print(f"Erro no job {job_id} (tentativa {tentativas}/{max_tentativas}): {erro}")
+    if isinstance(erro, CircuitoAberto):
+        tentativas -= 1
+        espera = erro.segundos
+    else:
+        espera = random.uniform(0.5, 1.0) * min(ESPERA_MAXIMA_JOB, ESPERA_BASE_JOB * 2 ** (tentativas - 1))
+    with transacao() as conn:
+        conn.execute("""UPDATE jobs SET status = ?, tentativas = ?, erro = ?, disponivel_em = ?,
+                               atualizado_em = CURRENT_TIMESTAMP WHERE id = ?""",
+                     ('pendente' if tentativas < max_tentativas else 'falhou', tentativas, str(erro),
+                      time.time() + espera, job_id))
+
+def _executar_job(job, fabrica_modelo):
+    inicio = time.perf_counter()
+    try:
+        dados, plano = rodar_conselho(job, fabrica_modelo)
+        with transacao() as conn:
+            marcar_concluido(conn, job[0], dados, plano, time.perf_counter() - inicio)
+    except Exception as e:
+        registrar_falha(job, e)
+
+def _worker(fabrica_modelo):
+    while True:
+        job = pegar_job()
+        if job is None:
+            _novo_job.wait(INTERVALO_POLL)
+            _novo_job.clear()
+            continue
+        _executar_job(job, fabrica_modelo)
+
+def _fabrica_padrao():
+    from agentes import configurar_google_api
+    return configurar_google_api()
+
+def iniciar_workers(fabrica_modelo=None, num_workers=NUM_WORKERS):
+    # Idempotente: o primeiro rerun do processo sobe os workers, os demais só retornam
+    with _workers_lock:
+        if _workers:
+            return
+        # Jobs que estavam rodando quando o processo anterior caiu voltam para a fila (lotes são retomados pela CLI)
+        with transacao() as conn:
+            conn.execute("UPDATE jobs SET status = 'pendente' WHERE status = 'executando' AND lote IS NULL")
+        for i in range(num_workers):
+            t = threading.Thread(target=_worker, args=(fabrica_modelo or _fabrica_padrao,),
+                                 name=f"worker-plano-{i}", daemon=True)
+            t.start()
+            _workers.append(t)
@@ -0,0 +1,136 @@
+# limitador.py
+import os
+import random
+import re
+import threading
+import time
+from rastreio import span, registrar
+
+# Limites do projeto na API (requisições e tokens por minuto); ajustáveis por variável de ambiente
+RPM = float(os.environ.get("MPT_RPM", 15))
+TPM = float(os.environ.get("MPT_TPM", 250000))
+MAX_TENTATIVAS = 5
+ESPERA_BASE = 2.0
+ESPERA_MAXIMA = 60.0
+FALHAS_PARA_ABRIR = 5
+SEGUNDOS_CIRCUITO_ABERTO = 30.0
+
+class CircuitoAberto(RuntimeError):
+    def __init__(self, segundos):
+        super().__init__(f"API instável; novas chamadas liberadas em {segundos:.0f}s.")
+        self.segundos = segundos
+
+class BaldeTokens:
+    def __init__(self, capacidade, por_segundo):
+        self.capacidade = capacidade
+        self.por_segundo = por_segundo
+        self.disponivel = capacidade
+        self.atualizado = time.monotonic()
+
+    def _repor(self, agora):
+        self.disponivel = min(self.capacidade, self.disponivel + (agora - self.atualizado) * self.por_segundo)
+        self.atualizado = agora
+
+    def reservar(self, quantidade, agora):
+        # Reserva já e devolve quanto tempo falta para a reserva estar coberta (saldo pode ficar negativo)
+        self._repor(agora)
+        self.disponivel -= min(quantidade, self.capacidade)
+        return max(0.0, -self.disponivel / self.por_segundo)
+
+def dica_do_servidor(erro):
+    # O 429 do Gemini costuma trazer RetryInfo nos details ou "retry in 12.3s" na mensagem
+    for detalhe in getattr(erro, "details", None) or []:
+        atraso = getattr(detalhe, "retry_delay", None)
+        if atraso is not None and getattr(atraso, "seconds", None) is not None:
+            return atraso.seconds + getattr(atraso, "nanos", 0) / 1e9
+    texto = str(erro)
+    m = re.search(r"retry in ([\d.]+)\s*s", texto, re.IGNORECASE) or re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", texto)
+    return float(m.group(1)) if m else None
+
+class LimitadorAPI:
+    def __init__(self, rpm=RPM, tpm=TPM):
+        self.requisicoes = BaldeTokens(rpm, rpm / 60)
+        self.tokens = BaldeTokens(tpm, tpm / 60)
+        self.pausado_ate = 0.0
+        self.falhas_seguidas = 0
+        self.circuito_aberto_ate = 0.0
+        self._lock = threading.Lock()
+        self.metricas = {"chamadas": 0, "esperas": 0, "espera_total": 0.0, "espera_maxima": 0.0,
+                         "throttles": 0, "retries": 0, "falhas": 0, "circuito_aberto": 0}
+
+    def adquirir(self, tokens_estimados):
+        with self._lock:
+            agora = time.monotonic()
+            if agora < self.circuito_aberto_ate:
+                raise CircuitoAberto(self.circuito_aberto_ate - agora)
+            # Todas as sessões dividem os mesmos baldes e a mesma pausa pedida pelo servidor
+            espera = max(self.requisicoes.reservar(1, agora), self.tokens.reservar(tokens_estimados, agora),
+                         self.pausado_ate - agora)
+            self.metricas["chamadas"] += 1
+            if espera > 0:
+                self.metricas["esperas"] += 1
+                self.metricas["espera_total"] += espera
+                self.metricas["espera_maxima"] = max(self.metricas["espera_maxima"], espera)
+        if espera > 0:
+            registrar("limitador.espera", espera)
+            time.sleep(espera)
+
+    def consumir_extra(self, tokens):
+        # Tokens de saída só são conhecidos depois da resposta
+        with self._lock:
+            self.tokens.reservar(tokens, time.monotonic())
+
+    def executar(self, funcao, tokens_estimados, ao_aguardar=None):
+        with span("llm.chamada", tokens_estimados=tokens_estimados) as s:
+            return self._executar(funcao, tokens_estimados, ao_aguardar, s)
+
+    def _executar(self, funcao, tokens_estimados, ao_aguardar, s):
+        from google.api_core import exceptions as google_exceptions
+        for tentativa in range(1, MAX_TENTATIVAS + 1):
+            s.definir(retries=tentativa - 1)
+            self.adquirir(tokens_estimados)
+            try:
+                resultado = funcao()
+            except google_exceptions.TooManyRequests as e:
+                # Backoff exponencial com jitter total; a dica do servidor, se houver, é o piso
+                espera = random.uniform(0, min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** tentativa))
+                espera = max(espera, dica_do_servidor(e) or 0.0)
+                with self._lock:
+                    self.metricas["throttles"] += 1
+                    self.pausado_ate = max(self.pausado_ate, time.monotonic() + espera)
+                    if tentativa < MAX_TENTATIVAS:
+                        self.metricas["retries"] += 1
+                if tentativa == MAX_TENTATIVAS:
+                    raise
+                if ao_aguardar:
+                    ao_aguardar(f"Aguardando API... ({tentativa}/{MAX_TENTATIVAS}, {espera:.0f}s)")
+                continue
+            except Exception:
+                with self._lock:
+                    self.metricas["falhas"] += 1
+                    self.falhas_seguidas += 1
+                    if self.falhas_seguidas >= FALHAS_PARA_ABRIR:
+                        self.circuito_aberto_ate = time.monotonic() + SEGUNDOS_CIRCUITO_ABERTO
+                        self.falhas_seguidas = 0
+                        self.metricas["circuito_aberto"] += 1
+                raise
+            with self._lock:
+                self.falhas_seguidas = 0
+            return resultado
+
+    def estatisticas(self):
+        with self._lock:
+            m = dict(self.metricas)
+        m["espera_media"] = m["espera_total"] / m["esperas"] if m["esperas"] else 0.0
+        return m
+
+_limitador = None
+_limitador_lock = threading.Lock()
+
+def obter_limitador():
+    # Um limitador por processo: conselho, jobs e chat de todas as sessões passam por ele
+    global _limitador
+    with _limitador_lock:
+        if _limitador is None:
+            _limitador = LimitadorAPI()
+        return _limitador
@@ -0,0 +1,171 @@
+# lote.py
+# Geração de planos em lote, sem Streamlit, para cadastrar equipes inteiras de uma vez.
+# Uso: python lote.py perfis.csv [--lote NOME] [--concorrencia 4] [--refazer-falhas] [--sem-pdf] [--sem-cache]
+#     [--rastreio spans.jsonl]
+# Os perfis usam as mesmas chaves do formulário de anamnese (CSV com cabeçalho ou JSONL, um perfil por linha).
+# Rodar de novo o mesmo arquivo retoma o lote: planos prontos são pulados e jobs interrompidos continuam
+# dos checkpoints de cada agente.
+import argparse
+import csv
+import json
+import os
+import queue
+import threading
+import time
+import rastreio
+from db_manager import init_db, transacao, conexao, gravar_pdfs, hash_plano
+from fila_jobs import enfileirar_lote, pegar_job, proximo_job_em, rodar_conselho, marcar_concluido, registrar_falha
+from referencias import perfis_invalidos, FAIXAS
+
+# Colunas numéricas do formulário; no CSV tudo chega como texto
+TIPOS = {"idade": int, "peso": float, "altura": int, "dias_treino": int, "tempo_treino": int,
+         "agua_atual": float, "sono": int, "estresse": int}
+# Chaves que o simular_agentes lê do perfil
+CAMPOS_OBRIGATORIOS = ("nome", "idade", "sexo", "peso", "altura", "objetivo_detalhado", "rotina_texto",
+                       "dias_treino", "local_treino", "tempo_treino", "lesoes", "saude_geral",
+                       "cozinha", "refeicoes_dia", "orcamento", "agua_atual")
+TAMANHO_ESCRITA = 20
+ESPERA_ESCRITA = 2.0
+_FIM = object()
+
+def _converter(perfil):
+    for campo, tipo in TIPOS.items():
+        valor = perfil.get(campo)
+        if isinstance(valor, str) and valor.strip():
+            perfil[campo] = tipo(valor.replace(",", "."))
+    return perfil
+
+def carregar_perfis(caminho):
+    with open(caminho, encoding="utf-8-sig", newline="") as f:
+        if caminho.lower().endswith((".jsonl", ".ndjson")):
+            perfis = [json.loads(linha) for linha in f if linha.strip()]
+        else:
+            perfis = list(csv.DictReader(f))
+    perfis = [_converter(p) for p in perfis]
+    # Valida tudo antes de enfileirar: um perfil incompleto falharia só depois de gastar chamadas ao LLM
+    for i, p in enumerate(perfis, start=1):
+        faltando = [c for c in CAMPOS_OBRIGATORIOS if c not in p]
+        if faltando:
+            raise ValueError(f"Perfil {i} ({p.get('nome') or 'sem nome'}) sem os campos: {', '.join(faltando)}")
+        if not p["nome"]:
+            raise ValueError(f"Perfil {i} sem nome; o nome identifica o usuário no banco.")
+    # Metas calculadas para o lote inteiro de uma vez; peso/altura/idade fora das faixas invalidariam as contas
+    invalidos = perfis_invalidos(perfis)
+    if invalidos:
+        faixas = ", ".join(f"{c} {a:.0f}-{b:.0f}" for c, (a, b) in FAIXAS.items())
+        raise ValueError(f"Perfis fora das faixas ({faixas}): " +
+                         ", ".join(f"{i + 1} ({perfis[i]['nome']})" for i in invalidos[:10]))
+    return perfis
+
+def _gravar(prontos):
+    # Usuários, planos, PDFs e status dos jobs de vários perfis num único commit
+    with transacao() as conn:
+        for job, dados, plano, _, segundos in prontos:
+            marcar_concluido(conn, job[0], dados, plano, segundos)
+        gravar_pdfs(conn, [(hash_plano(plano), pdf) for _, _, plano, pdf, _ in prontos if pdf])
+
+def executar_lote(lote, fabrica_modelo, concorrencia=4, com_pdf=True, tamanho_escrita=TAMANHO_ESCRITA):
+    # Threads pegam jobs do lote e rodam o conselho; a thread principal grava os resultados em blocos.
+    # Todas as chamadas passam pelo limitador do processo, então a concorrência não estoura o RPM/TPM.
+    resultados = queue.Queue()
+
+    def trabalhador():
+        from pdf_plano import gerar_pdf
+        try:
+            while True:
+                job = pegar_job(lote)
+                if job is None:
+                    # Nada livre agora: espera o próximo job em backoff; sem pendentes, a thread termina
+                    proximo = proximo_job_em(lote)
+                    if proximo is None:
+                        break
+                    time.sleep(min(max(proximo - time.time(), 0.05), ESPERA_ESCRITA))
+                    continue
+                inicio = time.perf_counter()
+                try:
+                    dados, plano = rodar_conselho(job, fabrica_modelo)
+                    pdf = gerar_pdf(plano) if com_pdf else None
+                    resultados.put((job, dados, plano, pdf, time.perf_counter() - inicio))
+                except Exception as e:
+                    registrar_falha(job, e)
+                    resultados.put((job, None, e, None, time.perf_counter() - inicio))
+        finally:
+            resultados.put(_FIM)
+
+    threads = [threading.Thread(target=trabalhador, name=f"lote-{i}", daemon=True) for i in range(concorrencia)]
+    for t in threads:
+        t.start()
+
+    latencias, erros, prontos = [], [], []
+    ativos = len(threads)
+    while ativos:
+        try:
+            item = resultados.get(timeout=ESPERA_ESCRITA)
+        except queue.Empty:
+            item = None  # fila parada: aproveita para gravar o que já terminou
+        if item is _FIM:
+            ativos -= 1
+        elif item is not None:
+            job, dados, plano, _, segundos = item
+            if dados is None:
+                erros.append((job[0], str(plano)))
+            else:
+                prontos.append(item)
+                latencias.append(segundos)
+                print(f"[{len(latencias)}] {dados['nome']}: plano pronto em {segundos:.1f}s")
+        if prontos and (len(prontos) >= tamanho_escrita or item is None):
+            _gravar(prontos)
+            prontos = []
+    if prontos:
+        _gravar(prontos)
+    return latencias, erros
+
+def relatorio(lote, latencias, erros, segundos):
+    with conexao() as conn:
+        status = dict(conn.execute("SELECT status, COUNT(*) FROM jobs WHERE lote = ? GROUP BY status", (lote,)).fetchall())
+        chamadas, entrada, saida = conn.execute("""SELECT SUM(chamadas_llm), SUM(tokens_entrada), SUM(tokens_saida)
+                                                   FROM jobs WHERE lote = ?""", (lote,)).fetchone()
+        falhas = conn.execute("SELECT id, dados_json, erro FROM jobs WHERE lote = ? AND status = 'falhou'", (lote,)).fetchall()
+
+    print(f"\n=== Lote '{lote}' ===")
+    print(f"Nesta execução: {len(latencias)} planos em {segundos:.1f}s "
+          f"({len(latencias) / segundos * 60 if segundos else 0:.1f} planos/min), {len(erros)} tentativas com erro")
+    if latencias:
+        ordenadas = sorted(latencias)
+        print("Latência por plano: " + " · ".join(f"p{p} {rastreio.percentil(ordenadas, p):.1f}s" for p in (50, 90, 95, 99))
+              + f" · máx {max(latencias):.1f}s")
+    print("Situação do lote: " + ", ".join(f"{n} {s}" for s, n in sorted(status.items())))
+    print(f"Uso acumulado do lote: {chamadas or 0} chamadas ao LLM, {entrada or 0} tokens de entrada, {saida or 0} de saída")
+    for job_id, dados_json, erro in falhas:
+        print(f"  FALHOU job {job_id} ({json.loads(dados_json).get('nome')}): {erro}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera planos em lote a partir de perfis em CSV ou JSONL.")
+    parser.add_argument("arquivo")
+    parser.add_argument("--lote", help="nome do lote (padrão: nome do arquivo); o mesmo nome retoma o lote")
+    parser.add_argument("--concorrencia", type=int, default=4, help="perfis processados ao mesmo tempo")
+    parser.add_argument("--tentativas", type=int, default=3, help="tentativas por perfil antes de desistir")
+    parser.add_argument("--refazer-falhas", action="store_true", help="recoloca na fila os perfis que falharam antes")
+    parser.add_argument("--sem-pdf", action="store_true", help="não renderiza os PDFs")
+    parser.add_argument("--rastreio", metavar="ARQUIVO", help="liga o rastreio e exporta os spans em JSONL no fim")
+    parser.add_argument("--sem-cache", action="store_true", help="ignora respostas em cache dos especialistas")
+    args = parser.parse_args()
+
+    if args.rastreio:
+        rastreio.ativar()
+    init_db()
+    lote = args.lote or os.path.splitext(os.path.basename(args.arquivo))[0]
+    perfis = carregar_perfis(args.arquivo)
+    situacao = enfileirar_lote(lote, perfis, usar_cache=not args.sem_cache, max_tentativas=args.tentativas,
+                               refazer_falhas=args.refazer_falhas)
+    print(f"Lote '{lote}': {len(perfis)} perfis no arquivo; " + ", ".join(f"{n} {s}" for s, n in sorted(situacao.items())))
+
+    from agentes import configurar_google_api
+    inicio = time.perf_counter()
+    latencias, erros = executar_lote(lote, configurar_google_api, args.concorrencia, com_pdf=not args.sem_pdf)
+    relatorio(lote, latencias, erros, time.perf_counter() - inicio)
+    if args.rastreio:
+        print(f"{rastreio.exportar(args.rastreio)} spans exportados para {args.rastreio}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# modelo_falso.py
+# Backend local que imita o GenerativeModel do Gemini: respostas gravadas, latência e velocidade
+# de geração configuráveis e 429 injetado. Serve para medir o app sem rede e sem gastar cota.
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from contexto import estimar_tokens
+
+# Uso de tokens no mesmo formato do usage_metadata do SDK
+Uso = namedtuple("Uso", "prompt_token_count candidates_token_count")
+Pedaco = namedtuple("Pedaco", "text")
+
+TOKENS_POR_PEDACO = 20
+
+# Quem está falando, pelo começo do prompt (personas de prompts.py)
+PERSONAS = (
+    ("Personal Trainer", "Personal Trainer"),
+    ("Fisioterapeuta", "Fisioterapeuta"),
+    ("Nutricionista", "Nutricionista"),
+    ("Coach de Saúde", "Coach de Saúde"),
+    ("assistente do time", "Chat"),
+)
+
+_TREINO = "\n\n".join(f"""### {dia}
+| Exercício | Séries | Repetições | Descanso |
+|---|---|---|---|
+| {a} | 4 | 8-10 | 90s |
+| {b} | 3 | 10-12 | 75s |
+| {c} | 3 | 12-15 | 60s |
+| Prancha | 3 | 40s | 45s |""" for dia, a, b, c in (
+    ("Segunda", "Agachamento livre", "Leg press", "Cadeira extensora"),
+    ("Quarta", "Supino reto", "Remada curvada", "Desenvolvimento com halteres"),
+    ("Sexta", "Levantamento terra romeno", "Afundo búlgaro", "Puxada frontal"),
+))
+
+# Respostas no formato que os agentes devolvem (seções + veredito), com tamanho parecido com o real
+RESPOSTAS_PADRAO = {
+    "Personal Trainer": f"[SEÇÃO: treino]\n{_TREINO}\n\nProgressão: aumente 2,5kg nos básicos a cada 2 semanas.\n"
+                        "VEREDITO: AJUSTE - treino de 3 dias criado",
+    "Fisioterapeuta": "[SEÇÃO: mobilidade]\n" + "\n".join(
+        f"- {p}: 2 séries de 30s por lado antes do treino, sem dor" for p in
+        ("Quadril 90/90", "Dorsiflexão de tornozelo", "Rotação torácica", "Rotação externa de ombro")) +
+        "\n\nAtenção à técnica no agachamento: joelhos alinhados com a ponta dos pés.\nVEREDITO: APROVADO",
+    "Nutricionista": "[SEÇÃO: nutricao]\nMeta: 2100 kcal, 130g de proteína.\n\n" + "\n".join(
+        f"- **{r}:** {c}" for r, c in (
+            ("Café da manhã", "2 ovos, 2 fatias de pão integral, 1 banana"),
+            ("Almoço", "150g de frango, 120g de arroz, 80g de feijão, salada"),
+            ("Lanche", "1 iogurte natural com 30g de aveia"),
+            ("Jantar", "150g de peixe, 200g de batata-doce, legumes"))) + "\nVEREDITO: APROVADO",
+    "Coach de Saúde": "[SEÇÃO: bem_estar]\n- **Sono:** 8h por noite, sem telas 30 minutos antes de deitar.\n"
+                      "- **Hidratação:** 35ml/kg, cerca de 2,5L por dia.\n"
+                      "- **Estresse:** 10 minutos de respiração diafragmática após o trabalho.\nVEREDITO: APROVADO",
+    "Chat": "Pode sim. Troque por leg press com a mesma faixa de repetições e mantenha o descanso de 90s. "
+            "Se sentir dor no joelho, reduza a amplitude e avise o fisioterapeuta.",
+}
+
+def _hash(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+def persona_do_prompt(prompt):
+    inicio = prompt[:400]
+    return next((persona for trecho, persona in PERSONAS if trecho in inicio), "Chat")
+
+def carregar_gravacoes(caminho):
+    # JSONL: {"persona": ..., "texto": ...} e, se gravado com GravadorModelo, também "prompt_hash"
+    por_prompt, por_persona = {}, {}
+    with open(caminho, encoding="utf-8") as f:
+        for linha in f:
+            if linha.strip():
+                g = json.loads(linha)
+                if g.get("prompt_hash"):
+                    por_prompt[g["prompt_hash"]] = g["texto"]
+                por_persona.setdefault(g["persona"], []).append(g["texto"])
+    return por_prompt, por_persona
+
+class RespostaFalsa:
+    # Iterável em pedaços como o stream do SDK; .text e .usage_metadata como a resposta completa
+    def __init__(self, texto, tokens_entrada, segundos_por_pedaco=0.0):
+        self.text = texto
+        self.usage_metadata = Uso(tokens_entrada, estimar_tokens(texto))
+        self._segundos_por_pedaco = segundos_por_pedaco
+
+    def __iter__(self):
+        tamanho = TOKENS_POR_PEDACO * 4
+        for i in range(0, len(self.text), tamanho):
+            if i and self._segundos_por_pedaco:
+                time.sleep(self._segundos_por_pedaco)
+            yield Pedaco(self.text[i:i + tamanho])
+
+class ModeloFalso:
+    def __init__(self, nome="modelo-falso", config=None, gravacoes=None, latencia=0.3, variacao=0.2,
+                 tokens_por_segundo=400.0, taxa_429=0.0, espera_429=1.0, semente=42):
+        self.model_name = nome
+        self._generation_config = config
+        self.latencia = latencia                      # segundos até o primeiro token
+        self.variacao = variacao                      # ± fração aleatória da latência
+        self.tokens_por_segundo = tokens_por_segundo  # 0 = resposta instantânea
+        self.taxa_429 = taxa_429                      # probabilidade de TooManyRequests por chamada
+        self.espera_429 = espera_429                  # "retry in Xs" sugerido no erro
+        self._por_prompt, self._por_persona = carregar_gravacoes(gravacoes) if gravacoes else ({}, {})
+        self._aleatorio = random.Random(semente)
+        self._lock = threading.Lock()
+        self.chamadas = 0
+        self.erros_429 = 0
+
+    @classmethod
+    def do_ambiente(cls, nome, config=None):
+        # Configuração pelo ambiente, para rodar o app inteiro com MPT_BACKEND=falso
+        return cls(nome, config, gravacoes=os.environ.get("MPT_FALSO_GRAVACOES"),
+                   latencia=float(os.environ.get("MPT_FALSO_LATENCIA", 0.3)),
+                   tokens_por_segundo=float(os.environ.get("MPT_FALSO_TOKENS_SEG", 400)),
+                   taxa_429=float(os.environ.get("MPT_FALSO_TAXA_429", 0)))
+
+    def _texto(self, prompt, sorteio):
+        # Prioridade: o mesmo prompt gravado -> uma gravação da mesma persona -> resposta padrão
+        texto = self._por_prompt.get(_hash(prompt))
+        if texto is not None:
+            return texto
+        persona = persona_do_prompt(prompt)
+        opcoes = self._por_persona.get(persona)
+        if opcoes:
+            return opcoes[int(sorteio * len(opcoes)) % len(opcoes)]
+        return RESPOSTAS_PADRAO[persona]
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        with self._lock:
+            self.chamadas += 1
+            falhar = self._aleatorio.random() < self.taxa_429
+            atraso = self.latencia * (1 + self._aleatorio.uniform(-self.variacao, self.variacao))
+            sorteio = self._aleatorio.random()
+            if falhar:
+                self.erros_429 += 1
+        if falhar:
+            from google.api_core import exceptions as google_exceptions
+            time.sleep(atraso / 4)
+            raise google_exceptions.TooManyRequests(f"429 Resource has been exhausted (modelo falso). "
+                                                    f"Please retry in {self.espera_429}s.")
+        # Como o request_options={"timeout": ...} do SDK: estoura com 504 se a latência passar do limite
+        timeout = (kwargs.get("request_options") or {}).get("timeout")
+        if timeout and atraso > timeout:
+            from google.api_core import exceptions as google_exceptions
+            time.sleep(timeout)
+            raise google_exceptions.DeadlineExceeded(f"504 Deadline exceeded após {timeout}s (modelo falso).")
+        texto = self._texto(prompt, sorteio)
+        por_token = 1 / self.tokens_por_segundo if self.tokens_por_segundo else 0.0
+        # Como o SDK, o stream já chega com o primeiro pedaço; o resto vem no ritmo de geração
+        time.sleep(atraso if stream else atraso + estimar_tokens(texto) * por_token)
+        return RespostaFalsa(texto, estimar_tokens(prompt), TOKENS_POR_PEDACO * por_token if stream else 0.0)
+
+class GravadorModelo:
+    # Envolve um modelo real e grava cada resposta em JSONL, no formato lido por carregar_gravacoes
+    def __init__(self, modelo, caminho):
+        self._modelo = modelo
+        self._caminho = caminho
+        self._lock = threading.Lock()
+        self.model_name = getattr(modelo, "model_name", "gravado")
+        self._generation_config = getattr(modelo, "_generation_config", None)
+
+    def _gravar(self, prompt, texto):
+        linha = json.dumps({"persona": persona_do_prompt(prompt), "prompt_hash": _hash(prompt), "texto": texto},
+                           ensure_ascii=False)
+        with self._lock, open(self._caminho, "a", encoding="utf-8") as f:
+            f.write(linha + "\n")
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        resposta = self._modelo.generate_content(prompt, stream=stream, **kwargs)
+        if not stream:
+            self._gravar(prompt, resposta.text)
+            return resposta
+        return self._repassar(prompt, resposta)
+
+    def _repassar(self, prompt, resposta):
+        gravador = self
+
+        class Repasse:
+            usage_metadata = property(lambda self: getattr(resposta, "usage_metadata", None))
+
+            def __iter__(self):
+                partes = []
+                for pedaco in resposta:
+                    try:
+                        partes.append(pedaco.text)
+                    except ValueError:
+                        pass
+                    yield pedaco
+                gravador._gravar(prompt, "".join(partes))
+
+        return Repasse()
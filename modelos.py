@@ -0,0 +1,56 @@
+# modelos.py
+import json
+import os
+import threading
+
+MODELO_PADRAO = "gemini-2.5-flash-lite"
+CONFIG_PADRAO = {"temperature": 0.7, "max_output_tokens": 8192}
+
+# Registro por processo: (backend, chave, modelo, config) -> modelo já configurado
+_registro = {}
+_registro_lock = threading.Lock()
+
+def chave_api():
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    if api_key:
+        return api_key
+    try:
+        import streamlit as st
+        if "google" in st.secrets and "api_key" in st.secrets["google"]:
+            return st.secrets["google"]["api_key"]
+        elif "GOOGLE_API_KEY" in st.secrets:
+            return st.secrets["GOOGLE_API_KEY"]
+    except:
+        pass
+    return None
+
+def _gemini(nome, config, api_key):
+    # Import pesado só quando um modelo é realmente pedido (a landing nunca paga por ele)
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name=nome, generation_config=config)
+
+def _falso(nome, config, api_key):
+    from modelo_falso import ModeloFalso
+    return ModeloFalso.do_ambiente(nome, config)
+
+# Backends plugáveis: fábrica(nome, config, api_key) -> objeto com generate_content(prompt, stream=False, **kwargs)
+# no formato do GenerativeModel (o roteador passa request_options={"timeout": ...}). MPT_BACKEND=falso roda o app inteiro sem rede (modelo_falso.py).
+BACKENDS = {"gemini": _gemini, "falso": _falso}
+
+def registrar_backend(nome, fabrica):
+    BACKENDS[nome] = fabrica
+
+def obter_modelo(nome=MODELO_PADRAO, config=None, backend=None):
+    backend = backend or os.environ.get("MPT_BACKEND", "gemini")
+    api_key = None
+    if backend == "gemini":
+        api_key = chave_api()
+        if not api_key:
+            return None
+    config = config or CONFIG_PADRAO
+    chave = (backend, api_key, nome, json.dumps(config, sort_keys=True))
+    with _registro_lock:
+        if chave not in _registro:
+            _registro[chave] = BACKENDS[backend](nome, config, api_key)
+        return _registro[chave]
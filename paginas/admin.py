@@ -1,29 +1,146 @@
 import streamlit as st
-import sqlite3
-import pandas as pd
-from db_manager import DB_NAME
+from db_manager import (versao_dados, listar_usuarios_pagina, listar_planos_pagina,
+                        ler_plano, estatisticas_admin, compactar_planos, MANTER_VERSOES)
+from cache_respostas import obter_cache
+from limitador import obter_limitador, RPM, TPM
+from roteador import obter_roteador, ROTAS
+import rastreio
+
+TAMANHO_PAGINA = 50
+
+# O primeiro argumento é a versão dos dados: qualquer escrita no banco muda a chave e invalida o cache
+@st.cache_data(max_entries=64)
+def _usuarios(versao, apos_id, busca):
+    return listar_usuarios_pagina(apos_id, busca, TAMANHO_PAGINA)
+
+@st.cache_data(max_entries=64)
+def _planos(versao, antes_id, busca, desde, ate):
+    return listar_planos_pagina(antes_id, busca, desde, ate, TAMANHO_PAGINA)
+
+@st.cache_data(max_entries=8)
+def _estatisticas(versao):
+    return estatisticas_admin()
+
+@st.cache_data(max_entries=32)
+def _texto_plano(plano_id):
+    # Versões não são editadas (a compactação só muda como são guardadas), então o texto fica em cache pelo id
+    return ler_plano(plano_id)
+
+def _paginador(chave, linhas, campo_cursor):
+    # Pilha de cursores na sessão: "Próxima" empilha o último id da página, "Anterior" desempilha
+    cursores = st.session_state.setdefault(chave, [])
+    c1, c2, c3 = st.columns([1, 1, 4])
+    if c1.button("⬅️ Anterior", key=f"{chave}_ant", disabled=not cursores):
+        cursores.pop()
+        st.rerun()
+    if c2.button("Próxima ➡️", key=f"{chave}_prox", disabled=len(linhas) < TAMANHO_PAGINA):
+        cursores.append(linhas[-1][campo_cursor])
+        st.rerun()
+    c3.caption(f"Página {len(cursores) + 1}")
 
 def mostrar_admin():
     st.title("🛠️ Área Administrativa do Banco de Dados")
-    
-    conn = sqlite3.connect(DB_NAME)
-    
+    versao = versao_dados()
+
+    stats = _estatisticas(versao)
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Usuários", stats["usuarios"])
+    c2.metric("Versões de planos", stats["planos"])
+    c3.metric("Tamanho médio do plano", f"{stats['tamanho_medio'] / 1024:.1f} KB")
+    c4.metric("Armazenado (planos + PDFs)", f"{stats['bytes_armazenados'] / 1024:.0f} KB")
+    retencao = f"manter {MANTER_VERSOES} versões por usuário" if MANTER_VERSOES else "todas as versões são mantidas"
+    if st.button(f"🗜️ Compactar histórico ({retencao})"):
+        r = compactar_planos()
+        st.toast(f"{r['usuarios']} usuários compactados · {r['versoes_removidas']} versões removidas · "
+                 f"{r['bytes_antes'] / 1024:.0f} KB → {r['bytes_depois'] / 1024:.0f} KB")
+    if stats["planos_por_dia"]:
+        import pandas as pd
+        st.bar_chart(pd.DataFrame(stats["planos_por_dia"], columns=["Dia", "Planos"]).set_index("Dia"))
+
     st.subheader("Usuários Cadastrados")
-    try:
-        df_users = pd.read_sql_query("SELECT * FROM usuarios", conn)
-        st.dataframe(df_users)
-    except:
+    busca_usuario = st.text_input("Buscar usuário", key="admin_busca_usuario")
+    if st.session_state.get("admin_busca_usuario_anterior") != busca_usuario:
+        st.session_state.admin_cursor_usuarios = []
+        st.session_state.admin_busca_usuario_anterior = busca_usuario
+    cursores = st.session_state.setdefault("admin_cursor_usuarios", [])
+    usuarios = _usuarios(versao, cursores[-1] if cursores else 0, busca_usuario)
+    if usuarios:
+        st.dataframe(usuarios)
+    else:
         st.warning("Nenhum usuário encontrado.")
-        
+    _paginador("admin_cursor_usuarios", usuarios, "id")
+
     st.subheader("Planos Gerados")
-    try:
-        df_planos = pd.read_sql_query("SELECT * FROM planos", conn)
-        st.dataframe(df_planos)
-    except:
+    c1, c2, c3 = st.columns(3)
+    busca_plano = c1.text_input("Filtrar por usuário", key="admin_busca_plano")
+    desde = c2.date_input("De", value=None, key="admin_desde")
+    ate = c3.date_input("Até", value=None, key="admin_ate")
+    filtros = (busca_plano, desde, ate)
+    if st.session_state.get("admin_filtros_anteriores") != filtros:
+        st.session_state.admin_cursor_planos = []
+        st.session_state.admin_filtros_anteriores = filtros
+    cursores = st.session_state.setdefault("admin_cursor_planos", [])
+    planos = _planos(versao, cursores[-1] if cursores else None, busca_plano, desde, ate)
+    if planos:
+        st.dataframe(planos)
+        # O texto completo só é carregado quando o admin abre um plano específico
+        plano_id = st.selectbox("Ver plano", [None] + [p["id"] for p in planos],
+                                format_func=lambda i: "—" if i is None else f"#{i}")
+        if plano_id is not None:
+            with st.expander(f"Plano #{plano_id}", expanded=True):
+                st.markdown(_texto_plano(plano_id))
+    else:
         st.warning("Nenhum plano encontrado.")
-        
-    conn.close()
-    
+    _paginador("admin_cursor_planos", planos, "id")
+
+    st.subheader("Cache de Respostas dos Especialistas")
+    stats = obter_cache().estatisticas()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Hits (memória)", stats["hits_memoria"])
+    c2.metric("Hits (disco)", stats["hits_disco"])
+    c3.metric("Misses", stats["misses"])
+    c4.metric("Taxa de acerto", f"{stats['taxa_acerto']:.0%}")
+    st.caption(f"{stats['itens_memoria']} itens em memória · {stats['bytes_disco'] / 1024:.0f} KB em disco · {stats['remocoes']} remoções")
+
+    st.subheader("Limitador da API")
+    lim = obter_limitador().estatisticas()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Chamadas", lim["chamadas"])
+    c2.metric("Espera média na fila", f"{lim['espera_media']:.1f}s")
+    c3.metric("Throttles (429)", lim["throttles"])
+    c4.metric("Circuito aberto", lim["circuito_aberto"])
+    st.caption(f"Limites: {RPM:.0f} req/min · {TPM:.0f} tokens/min · {lim['esperas']} chamadas esperaram "
+               f"(máx. {lim['espera_maxima']:.1f}s) · {lim['retries']} retries · {lim['falhas']} falhas")
+
+    st.subheader("Modelos por Perfil")
+    perfis = obter_roteador().estatisticas()
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Custo estimado", f"US$ {sum(p['custo_usd'] for p in perfis):.4f}")
+    c2.metric("Fallbacks", sum(p["fallbacks"] for p in perfis))
+    c3.metric("429 / timeouts", f"{sum(p['throttles'] for p in perfis)} / {sum(p['timeouts'] for p in perfis)}")
+    st.dataframe(perfis, column_config={"custo_usd": st.column_config.NumberColumn(format="%.4f"),
+                                        "p50_ms": st.column_config.NumberColumn(format="%.0f"),
+                                        "p95_ms": st.column_config.NumberColumn(format="%.0f")})
+    st.caption(" · ".join(f"{papel}: {' → '.join(rota)}" for papel, rota in ROTAS.items()))
+
+    st.subheader("Rastreio de Desempenho")
+    # Spans ficam em memória no processo (conselho, jobs, chat, banco e PDF); desligado, o custo é desprezível
+    ligado = st.toggle("Rastreio ligado", value=rastreio.ativo())
+    if ligado != rastreio.ativo():
+        rastreio.ativar(ligado)
+    etapas = rastreio.resumo_etapas()
+    if etapas:
+        st.dataframe(etapas, column_config={c: st.column_config.NumberColumn(format="%.1f")
+                                            for c in ("p50_ms", "p95_ms", "p99_ms", "total_s")})
+        c1, c2 = st.columns(2)
+        if c1.button("💾 Exportar para rastreio.jsonl"):
+            st.toast(f"{rastreio.exportar('rastreio.jsonl')} spans exportados")
+        if c2.button("🧹 Limpar spans"):
+            rastreio.limpar()
+            st.rerun()
+    else:
+        st.caption("Nenhum span registrado ainda. Ligue o rastreio (ou MPT_RASTREIO=1) e gere um plano.")
+
     if st.button("⬅️ Voltar ao Início"):
         st.session_state.pagina_atual = 'landing'
         st.rerun()
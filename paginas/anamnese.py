@@ -1,5 +1,6 @@
 import streamlit as st
-from agentes import simular_agentes, configurar_google_api
+from agentes import configurar_google_api
+from fila_jobs import enfileirar
 
 def mostrar_anamnese():
     st.title("Anamnese Profissional")
@@ -40,6 +41,8 @@ def mostrar_anamnese():
             estresse = st.slider("Estresse", 0, 10, 5)
             saude_geral = st.text_input("Saúde Geral", placeholder="Diabetes...")
 
+        nova_variacao = st.checkbox("Gerar uma variação nova (ignorar respostas em cache)")
+
         if st.form_submit_button("Gerar Plano"):
             d = {
                 "nome": nome, "idade": idade, "sexo": sexo, "peso": peso, "altura": altura,
@@ -50,15 +53,10 @@ def mostrar_anamnese():
                 "suplementos": suplementos, "trabalho": trabalho, "sono": sono, "estresse": estresse, "saude_geral": saude_geral
             }
             st.session_state.dados_usuario = d
-            plano_gerado = simular_agentes(d, model)
-            st.session_state.plano_final = plano_gerado
-            
-            # Persistência
-            from db_manager import salvar_usuario, salvar_plano, buscar_usuario
-            salvar_usuario(d)
-            user_id, _ = buscar_usuario(d['nome']) # Recupera ID recém criado
-            if user_id:
-                salvar_plano(user_id, plano_gerado)
-            
+            # O conselho roda num worker em segundo plano; o dashboard acompanha o progresso
+            st.session_state.job_id = enfileirar(d, usar_cache=not nova_variacao)
+            st.session_state.plano_final = ""
+            st.session_state.pop('usuario_id', None)
+            st.session_state.chat_history = []
             st.session_state.pagina_atual = 'dashboard'
             st.rerun()
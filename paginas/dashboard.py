@@ -1,6 +1,115 @@
+import difflib
+from datetime import date, timedelta
 import streamlit as st
-import time
-from agentes import gerar_pdf, configurar_google_api
+from agentes import configurar_google_api, gerar_stream, AGENTES
+from fila_jobs import status_job, reenfileirar
+from contexto import prompt_chat, estimar_tokens
+from roteador import modelo_para
+from db_manager import (ler_chat, salvar_mensagens_chat, listar_versoes, ler_versao, HABITOS,
+                        registrar_checkin, ler_checkin, progresso_checkins)
+from plano_secoes import SECOES, secoes_do_documento
+
+ICONES = {nome: icon for nome, icon, *_ in AGENTES}
+
+def _pdf(plano, memo):
+    # fpdf só é importado quando alguém realmente pede o download
+    from pdf_plano import pdf_do_plano
+    return pdf_do_plano(plano, memo)
+
+def _diff_secoes(antigo, novo):
+    # [(título, linhas do diff)] só das seções que mudaram
+    a, b = secoes_do_documento(antigo), secoes_do_documento(novo)
+    mudancas = []
+    for nome, titulo in SECOES:
+        if a.get(nome) != b.get(nome):
+            linhas = difflib.unified_diff((a.get(nome) or "").splitlines(), (b.get(nome) or "").splitlines(),
+                                          lineterm="", n=1)
+            mudancas.append((titulo, list(linhas)[2:]))
+    return mudancas
+
+@st.fragment
+def mostrar_checkin(usuario_id):
+    # Fragmento: marcar e salvar o check-in não reroda o plano e o chat da página
+    hoje = date.today()
+    dia = st.date_input("Dia", hoje, min_value=hoje - timedelta(days=30), max_value=hoje, format="DD/MM/YYYY")
+    marcado = ler_checkin(usuario_id, dia) or {}
+    colunas = st.columns(len(HABITOS))
+    habitos = {h: c.checkbox(h.capitalize(), value=marcado.get(h, False), key=f"checkin_{h}_{dia}")
+               for h, c in zip(HABITOS, colunas)}
+    if st.button("Salvar"):
+        registrar_checkin(usuario_id, dia, habitos)
+        st.toast("Salvo!")
+
+    progresso = progresso_checkins(usuario_id, hoje=hoje)
+    if not progresso:
+        return
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Sequência atual", f"{progresso['sequencia_atual']} dias")
+    c2.metric("Melhor sequência", f"{progresso['melhor_sequencia']} dias")
+    c3.metric("Dias registrados", progresso["dias"])
+    st.caption(" · ".join(f"{h.capitalize()}: {taxa:.0%} dos dias" for h, taxa in progresso["taxas"].items()))
+    if progresso["semanas"]:
+        st.subheader("Aderência por semana")
+        semanas = progresso["semanas"]
+        st.bar_chart({"semana": [s["semana"] for s in semanas], **{h.capitalize(): [s[h] for s in semanas] for h in HABITOS}},
+                     x="semana", stack=False)
+
+@st.fragment
+def mostrar_historico(usuario_id):
+    versoes = listar_versoes(usuario_id)
+    if len(versoes) < 2:
+        return
+    with st.expander(f"🕓 Histórico ({len(versoes)} versões)"):
+        rotulos = {v["versao"]: f"v{v['versao']} · {v['data_criacao']}" for v in versoes}
+        numeros = list(rotulos)
+        c1, c2 = st.columns(2)
+        de = c1.selectbox("Comparar", numeros, index=1, format_func=rotulos.get, key="versao_de")
+        para = c2.selectbox("com", numeros, index=0, format_func=rotulos.get, key="versao_para")
+        mudancas = _diff_secoes(ler_versao(usuario_id, de), ler_versao(usuario_id, para))
+        if not mudancas:
+            st.info("As duas versões são iguais.")
+        for titulo, linhas in mudancas:
+            st.markdown(f"**{titulo.lstrip('# ')}**")
+            st.code("\n".join(linhas) or "(seção removida)", language="diff")
+
+@st.fragment(run_every=1.5)
+def mostrar_progresso(job_id):
+    # Consulta o job a cada 1,5s: falas concluídas vêm dos checkpoints, as em andamento do texto parcial
+    job = status_job(job_id)
+    if job is None:
+        st.session_state.pop('job_id', None)
+        st.rerun()
+
+    st.subheader("💬 Reunião do Conselho")
+    st.caption(f"Status: {job['status']} · tentativa {job['tentativas']}/{job['max_tentativas']}")
+    ciclo_atual = None
+    for ciclo, nome, resp, segundos, tokens in job['etapas']:
+        if ciclo != ciclo_atual:
+            ciclo_atual = ciclo
+            st.markdown(f"**--- 🔄 Ciclo {ciclo} ---**")
+        with st.chat_message(nome, avatar=ICONES.get(nome)):
+            st.write(f"**{nome}**: {resp[:300]}..." if len(resp) > 300 else f"**{nome}**: {resp}")
+            st.caption(f"⏱️ {segundos:.1f}s" + (f" · ~{tokens} tokens de prompt" if tokens else ""))
+            with st.expander("Ver detalhes"):
+                st.markdown(resp)
+    for nome, texto in job['parciais'].items():
+        with st.chat_message(nome, avatar=ICONES.get(nome)):
+            st.markdown(f"**{nome}**: {texto} ▌")
+
+    if job['status'] == 'concluido':
+        st.session_state.plano_final = job['plano_texto']
+        st.session_state.usuario_id = job['usuario_id']
+        st.session_state.chat_history = ler_chat(job['usuario_id'])
+        st.session_state.pop('job_id')
+        st.toast(f"Plano gerado em {job['segundos_total']:.1f}s · {job['chamadas_llm'] or 0} chamadas ao LLM · "
+                 f"{(job['tokens_entrada'] or 0) + (job['tokens_saida'] or 0)} tokens")
+        st.rerun()
+    elif job['status'] == 'falhou':
+        st.error(f"Não foi possível gerar o plano: {job['erro']}")
+        if st.button("🔁 Tentar novamente"):
+            reenfileirar(job_id)
+    else:
+        st.info("Os especialistas estão trabalhando. Você pode fechar a página e voltar depois.")
 
 def mostrar_dashboard():
     nome = st.session_state.dados_usuario.get('nome', 'Usuário')
@@ -9,22 +118,29 @@ def mostrar_dashboard():
     if st.button("⬅️ Início"):
         st.session_state.pagina_atual = 'landing'
         st.rerun()
+
+    if st.session_state.get('job_id'):
+        mostrar_progresso(st.session_state.job_id)
+        return
     
     tab1, tab2, tab3 = st.tabs(["📋 Plano", "✅ Check-in", "💬 Chat"])
     
     with tab1:
         st.success("Plano Aprovado.")
-        try:
-            pdf_bytes = gerar_pdf(st.session_state.plano_final)
-            st.download_button("📥 Baixar PDF", pdf_bytes, "plano.pdf", "application/pdf")
-        except: st.warning("Erro PDF.")
+        # PDF só é renderizado quando o download é pedido; o memo da sessão e o banco evitam refazer
+        plano = st.session_state.plano_final
+        memo_pdf = st.session_state.setdefault('pdfs', {})
+        st.download_button("📥 Baixar PDF", lambda: _pdf(plano, memo_pdf), "plano.pdf", "application/pdf")
         st.markdown(st.session_state.plano_final)
+        if st.session_state.get('usuario_id'):
+            mostrar_historico(st.session_state.usuario_id)
         
     with tab2:
-        st.header("Hoje")
-        c1, c2, c3 = st.columns(3)
-        c1.checkbox("Treino"); c2.checkbox("Dieta"); c3.checkbox("Sono")
-        if st.button("Salvar"): st.toast("Salvo!")
+        st.header("Check-in")
+        if st.session_state.get('usuario_id'):
+            mostrar_checkin(st.session_state.usuario_id)
+        else:
+            st.info("Salve o seu perfil para registrar os check-ins.")
 
     with tab3:
         st.header("Assistente")
@@ -34,13 +150,20 @@ def mostrar_dashboard():
             st.chat_message(msg["role"]).write(msg["content"])
 
         if prompt := st.chat_input("Dúvida?"):
+            # Só os trechos do plano/perfil ligados à pergunta e um resumo curto das últimas falas vão ao modelo
+            ctx = prompt_chat(st.session_state.plano_final, st.session_state.dados_usuario,
+                              st.session_state.chat_history, prompt)
             st.session_state.chat_history.append({"role": "user", "content": prompt})
             st.chat_message("user").write(prompt)
             
             if model:
                 with st.chat_message("assistant"):
-                    with st.spinner("Pensando..."):
-                        ctx = f"Plano atual:\n{st.session_state.plano_final}\nUsuário disse: {prompt}"
-                        resp = model.generate_content(ctx).text
-                        st.write(resp)
-                        st.session_state.chat_history.append({"role": "assistant", "content": resp})
+                    # Renderiza os tokens conforme chegam; write_stream devolve o texto completo
+                    resp = st.write_stream(gerar_stream(modelo_para(model, "Chat"), ctx))
+                    st.session_state.chat_history.append({"role": "assistant", "content": resp})
+                    tokens = estimar_tokens(ctx)
+                    st.caption(f"~{tokens} tokens enviados (com o plano inteiro seriam "
+                               f"~{estimar_tokens(st.session_state.plano_final + prompt)})")
+                if st.session_state.get('usuario_id'):
+                    salvar_mensagens_chat(st.session_state.usuario_id,
+                                          [("user", prompt, tokens), ("assistant", resp, None)])
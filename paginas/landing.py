@@ -1,5 +1,5 @@
 import streamlit as st
-from db_manager import listar_usuarios, buscar_usuario, ler_plano_recente
+from db_manager import listar_usuarios, buscar_usuario, ler_plano_recente, ler_chat
 
 def mostrar_landing():
     st.title("Bem-vindo ao My Personal Team 🧬")
@@ -24,6 +24,8 @@ def mostrar_landing():
                 user_id, dados = buscar_usuario(usuario_selecionado)
                 if dados:
                     st.session_state.dados_usuario = dados
+                    st.session_state.usuario_id = user_id
+                    st.session_state.chat_history = ler_chat(user_id)
                     # Tenta carregar o plano
                     plano = ler_plano_recente(user_id)
                     if plano:
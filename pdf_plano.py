@@ -0,0 +1,125 @@
+# pdf_plano.py
+import re
+from fpdf import FPDF
+from db_manager import hash_plano, buscar_pdf, salvar_pdf
+from rastreio import rastreado
+
+# Markdown que o Coach costuma emitir, classificado numa única passada por linha
+_TITULO = re.compile(r"^(#{1,6})\s*(.*)$")
+_ITEM_LISTA = re.compile(r"^(\s*)(?:[-*+]|(\d+)[.)])\s+(.*)$")
+_LINHA_TABELA = re.compile(r"^\s*\|(.*)\|\s*$")
+_SEPARADOR_TABELA = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+_REGRA = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+
+_TROCAS = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'", "–": "-", "—": "-", "…": "...", "•": "\x95"})
+
+def _latin1(texto):
+    # Fontes padrão do FPDF são latin-1: troca tipografia comum e descarta emojis
+    return texto.translate(_TROCAS).encode("latin-1", "ignore").decode("latin-1").strip()
+
+class PDF(FPDF):
+    def header(self):
+        # Logo ou Título
+        self.set_font('Arial', 'B', 16)
+        self.cell(0, 10, 'Plano de Saúde Holística - IA', 0, 1, 'C')
+        self.ln(5)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+
+    def texto_rico(self, texto, altura=6, estilo_base=''):
+        # Negrito inline: segmentos ímpares do split por ** são negrito
+        for i, trecho in enumerate(texto.split("**")):
+            if trecho:
+                estilo = 'B' if i % 2 else estilo_base
+                self.set_font('Arial', estilo, self.font_size_pt)
+                self.write(altura, trecho)
+        self.set_font('Arial', estilo_base, self.font_size_pt)
+        self.ln(altura)
+
+    def tabela(self, linhas):
+        largura_util = self.w - self.l_margin - self.r_margin
+        n_colunas = max(len(l) for l in linhas)
+        largura = largura_util / n_colunas
+        self.set_font('Arial', '', 9)
+        for n, linha in enumerate(linhas):
+            celulas = [c.replace("**", "") for c in linha] + [""] * (n_colunas - len(linha))
+            # Estima a altura da linha para quebrar a página antes e não partir a linha no meio
+            n_linhas = max(int(self.get_string_width(c) / max(largura - 2, 1)) + 1 for c in celulas)
+            altura = 5 * n_linhas
+            if self.get_y() + altura > self.page_break_trigger:
+                self.add_page()
+            x0, y0 = self.l_margin, self.get_y()
+            self.set_font('Arial', 'B' if n == 0 else '', 9)
+            y_max = y0
+            for i, celula in enumerate(celulas):
+                self.set_xy(x0 + i * largura, y0)
+                self.multi_cell(largura, 5, celula, 0, 'L', n == 0)
+                y_max = max(y_max, self.get_y())
+            for i in range(n_colunas):
+                self.rect(x0 + i * largura, y0, largura, y_max - y0)
+            self.set_xy(x0, y_max)
+        self.set_font('Arial', '', 11)
+        self.ln(3)
+
+def _celulas(linha):
+    return [_latin1(c) for c in _LINHA_TABELA.match(linha).group(1).split("|")]
+
+@rastreado("pdf.gerar")
+def gerar_pdf(texto_plano):
+    pdf = PDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.set_fill_color(230, 230, 230)
+    pdf.set_font("Arial", size=11)
+
+    tabela = []
+    try:
+        for linha in texto_plano.split('\n') + [""]:
+            if _LINHA_TABELA.match(linha):
+                if not _SEPARADOR_TABELA.match(linha):
+                    tabela.append(_celulas(linha))
+                continue
+            if tabela:
+                pdf.tabela(tabela)
+                tabela = []
+
+            if _REGRA.match(linha):
+                pdf.ln(2)
+                y = pdf.get_y()
+                pdf.line(pdf.l_margin, y, pdf.w - pdf.r_margin, y)
+                pdf.ln(2)
+            elif m := _TITULO.match(linha):
+                nivel = len(m.group(1))
+                pdf.ln(5 if nivel <= 2 else 3)
+                pdf.set_font("Arial", 'B', {1: 16, 2: 14}.get(nivel, 12))
+                pdf.multi_cell(0, 8, _latin1(m.group(2).replace("**", "")))
+                pdf.set_font("Arial", size=11)
+            elif m := _ITEM_LISTA.match(linha):
+                recuo, numero, texto = m.groups()
+                pdf.set_x(pdf.l_margin + 4 + 2 * len(recuo))
+                pdf.write(6, f"{numero}. " if numero else "\x95 ")
+                pdf.texto_rico(_latin1(texto))
+            elif linha.strip():
+                pdf.texto_rico(_latin1(linha))
+            else:
+                pdf.ln(3)
+    except Exception as e:
+        pdf.multi_cell(0, 6, txt=f"Erro ao formatar PDF: {e}")
+
+    return pdf.output(dest='S').encode('latin-1')
+
+def pdf_do_plano(texto_plano, memo=None):
+    # Ordem: memo da sessão -> coluna pdf do plano no banco -> renderiza e persiste
+    chave = hash_plano(texto_plano)
+    if memo is not None and chave in memo:
+        return memo[chave]
+    pdf_bytes = buscar_pdf(chave)
+    if pdf_bytes is None:
+        pdf_bytes = gerar_pdf(texto_plano)
+        salvar_pdf(chave, pdf_bytes)
+    if memo is not None:
+        memo[chave] = pdf_bytes
+    return pdf_bytes
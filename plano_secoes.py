@@ -0,0 +1,120 @@
+# plano_secoes.py
+import json
+import re
+from difflib import SequenceMatcher
+
+# Seções do plano, na ordem do documento final: (nome, título em Markdown)
+SECOES = [
+    ("treino", "## 🏋️ PLANO DE TREINO"),
+    ("mobilidade", "## 🤸 MOBILIDADE E AQUECIMENTO"),
+    ("nutricao", "## 🍎 PLANO NUTRICIONAL DIÁRIO"),
+    ("bem_estar", "## 🧘 BEM-ESTAR"),
+]
+NOMES_SECOES = [nome for nome, _ in SECOES]
+
+# Os agentes devolvem só o que mudou, em blocos "[SEÇÃO: nome]"; o bloco vai até o próximo marcador
+_MARCADOR = re.compile(r"^[\s*#]*\[\s*SE[ÇC][ÃA]O\s*:\s*([\wÀ-ú\-\s]+?)\s*\][\s*]*$", re.IGNORECASE | re.MULTILINE)
+# Texto sem marcador só vale como seção se tiver cara de plano: títulos, tabelas ou listas em Markdown
+_ESTRUTURA = re.compile(r"^\s*(#{1,6}\s|\|.*\||[-*+]\s|\d+[.)]\s)", re.MULTILINE)
+_TITULOS = {titulo.split(" ", 2)[-1].lower(): nome for nome, titulo in SECOES}
+
+def _normalizar(nome):
+    nome = nome.strip().lower().replace("-", "_").replace(" ", "_")
+    return {"nutrição": "nutricao", "nutricão": "nutricao", "bemestar": "bem_estar"}.get(nome, nome)
+
+def extrair_secoes(resposta, secao_padrao=None):
+    # {nome: texto} das seções presentes na resposta. Sem marcadores, o texto todo vira a seção padrão do agente,
+    # desde que tenha estrutura de plano (um comentário solto não pode substituir uma seção inteira).
+    marcadores = list(_MARCADOR.finditer(resposta))
+    if not marcadores:
+        texto = resposta.strip()
+        return {secao_padrao: texto} if secao_padrao and _ESTRUTURA.search(texto) else {}
+    secoes = {}
+    for i, m in enumerate(marcadores):
+        fim = marcadores[i + 1].start() if i + 1 < len(marcadores) else len(resposta)
+        nome = _normalizar(m.group(1))
+        texto = resposta[m.end():fim].strip()
+        if nome in NOMES_SECOES and texto:
+            secoes[nome] = texto
+    return secoes
+
+def mesclar(plano, *deltas):
+    # Plano novo = plano anterior com as seções de cada delta substituídas (as posteriores ganham)
+    novo = dict(plano)
+    for delta in deltas:
+        novo.update(delta)
+    return novo
+
+def plano_para_prompt(plano):
+    if not plano:
+        return "Nenhum plano ainda."
+    return "\n\n".join(f"[SEÇÃO: {nome}]\n{plano[nome]}" for nome in NOMES_SECOES if nome in plano)
+
+def montar_documento(plano):
+    return "\n\n".join(f"{titulo}\n\n{plano[nome]}" for nome, titulo in SECOES if nome in plano)
+
+def secoes_do_documento(documento):
+    # Caminho inverso de montar_documento: separa um plano salvo pelos títulos das seções
+    secoes, atual, linhas = {}, None, []
+    for linha in documento.splitlines():
+        titulo = linha.strip()
+        if titulo.startswith("## "):
+            nome = next((n for t, n in _TITULOS.items() if t in titulo.lower()), None)
+            if nome:
+                # Texto antes do primeiro título conhecido fica na primeira seção
+                if atual:
+                    secoes[atual] = "\n".join(linhas).strip()
+                    linhas = []
+                atual = nome
+                continue
+        linhas.append(linha)
+    if atual:
+        secoes[atual] = "\n".join(linhas).strip()
+    elif documento.strip():
+        # Planos antigos, gerados antes das seções, ficam inteiros como uma seção só
+        secoes["treino"] = documento.strip()
+    return secoes
+
+# --- Versionamento (db_manager): o plano vira {seção: texto} e versões guardam só as seções que mudaram ---
+
+BRUTO = "_bruto"
+
+def secoes_exatas(documento):
+    # Seções que remontam exatamente o mesmo texto; planos antigos ou editados ficam inteiros numa chave só
+    secoes = secoes_do_documento(documento)
+    return secoes if montar_documento(secoes) == documento else {BRUTO: documento}
+
+def documento_das_secoes(secoes):
+    return secoes[BRUTO] if BRUTO in secoes else montar_documento(secoes)
+
+def _remendo(antigo, novo):
+    # Diferença por linha: [[i1, i2, linhas novas], ...] trocando antigo[i1:i2]; None se não compensar
+    a, b = antigo.split("\n"), novo.split("\n")
+    remendo = [[i1, i2, b[j1:j2]] for op, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+               if op != "equal"]
+    return remendo if len(json.dumps(remendo, ensure_ascii=False)) < len(novo) else None
+
+def diferenca(antigo, novo):
+    # Seções novas ou alteradas; None marca seção que deixou de existir.
+    # Seção que já existia vai como remendo de linhas quando ele sai menor que o texto inteiro.
+    delta = {}
+    for nome, texto in novo.items():
+        if antigo.get(nome) != texto:
+            remendo = _remendo(antigo[nome], texto) if nome in antigo else None
+            delta[nome] = texto if remendo is None else remendo
+    delta.update({nome: None for nome in antigo if nome not in novo})
+    return delta
+
+def aplicar(plano, delta):
+    novo = dict(plano)
+    for nome, texto in delta.items():
+        if texto is None:
+            novo.pop(nome, None)
+        elif isinstance(texto, list):
+            linhas = novo[nome].split("\n")
+            for i1, i2, trecho in reversed(texto):
+                linhas[i1:i2] = trecho
+            novo[nome] = "\n".join(linhas)
+        else:
+            novo[nome] = texto
+    return novo
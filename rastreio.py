@@ -0,0 +1,118 @@
+# rastreio.py
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+# Desligado por padrão: span() devolve um objeto nulo e o custo é uma checagem de flag por chamada
+MAX_SPANS = 50000
+_ativo = os.environ.get("MPT_RASTREIO", "") not in ("", "0")
+_spans = deque(maxlen=MAX_SPANS)  # (etapa, início em epoch, segundos, thread, atributos)
+_lock = threading.Lock()
+
+def ativo():
+    return _ativo
+
+def ativar(ligado=True):
+    global _ativo
+    _ativo = ligado
+
+class Span:
+    __slots__ = ("etapa", "atributos", "inicio")
+
+    def __init__(self, etapa, atributos):
+        self.etapa = etapa
+        self.atributos = atributos
+
+    def definir(self, **atributos):
+        self.atributos.update(atributos)
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, erro, tb):
+        if tipo is not None:
+            self.atributos["erro"] = tipo.__name__
+        registrar(self.etapa, time.perf_counter() - self.inicio, **self.atributos)
+        return False
+
+class _SpanNulo:
+    __slots__ = ()
+
+    def definir(self, **atributos):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        return False
+
+_NULO = _SpanNulo()
+
+def registrar(etapa, segundos, **atributos):
+    # Para durações medidas por quem chama (ex.: espera no limitador)
+    if _ativo:
+        with _lock:
+            _spans.append((etapa, time.time() - segundos, segundos, threading.current_thread().name, atributos))
+
+def span(etapa, **atributos):
+    if not _ativo:
+        return _NULO
+    return Span(etapa, atributos)
+
+def rastreado(etapa):
+    def decorador(funcao):
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            if not _ativo:
+                return funcao(*args, **kwargs)
+            with Span(etapa, {}):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+def spans():
+    with _lock:
+        return list(_spans)
+
+def limpar():
+    with _lock:
+        _spans.clear()
+
+def percentil(ordenados, p):
+    # Percentil p (0-100) por vizinho mais próximo sobre uma lista já ordenada; 0.0 se vazia
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def resumo_etapas():
+    # Uma linha por etapa: contagem, p50/p95/p99 em ms, tempo total e somas de tokens/retries quando houver
+    por_etapa = {}
+    for etapa, _, segundos, _, atributos in spans():
+        item = por_etapa.setdefault(etapa, {"duracoes": [], "tokens_entrada": 0, "tokens_saida": 0,
+                                            "retries": 0, "erros": 0})
+        item["duracoes"].append(segundos)
+        item["tokens_entrada"] += atributos.get("tokens_entrada", 0)
+        item["tokens_saida"] += atributos.get("tokens_saida", 0)
+        item["retries"] += atributos.get("retries", 0)
+        item["erros"] += "erro" in atributos
+    linhas = []
+    for etapa, item in sorted(por_etapa.items()):
+        d = sorted(item.pop("duracoes"))
+        linhas.append({"etapa": etapa, "n": len(d), "p50_ms": percentil(d, 50) * 1000,
+                       "p95_ms": percentil(d, 95) * 1000, "p99_ms": percentil(d, 99) * 1000,
+                       "total_s": sum(d), **item})
+    return linhas
+
+def exportar(caminho):
+    # JSONL, um span por linha, para análise offline (pandas.read_json(caminho, lines=True))
+    registros = spans()
+    with open(caminho, "w", encoding="utf-8") as f:
+        for etapa, inicio, segundos, thread, atributos in registros:
+            f.write(json.dumps({"etapa": etapa, "inicio": inicio, "segundos": segundos, "thread": thread,
+                                **atributos}, ensure_ascii=False) + "\n")
+    return len(registros)
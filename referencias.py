@@ -0,0 +1,263 @@
+# referencias.py
+# Metas (TMB, gasto, calorias, macros, água) e tabelas locais de alimentos e exercícios.
+# A aritmética é feita aqui, de forma determinística e vetorizada; os agentes recebem os números prontos.
+import re
+import unicodedata
+import numpy as np
+from busca_plano import termos
+
+# Mifflin-St Jeor: 10*peso + 6,25*altura - 5*idade + ajuste do sexo
+AJUSTE_SEXO = {"Masculino": 5.0, "Feminino": -161.0}
+AJUSTE_SEXO_OUTRO = -78.0
+# Fator de atividade pelo número de dias de treino (índice = dias/semana)
+FATOR_ATIVIDADE = np.array([1.2, 1.375, 1.375, 1.375, 1.55, 1.55, 1.725, 1.725])
+BONUS_TRABALHO_ATIVO = 0.1
+
+# Objetivo: 0 manter, 1 perder gordura, 2 ganhar massa (pelas palavras do objetivo_detalhado)
+OBJETIVOS = ("manutenção", "perda de gordura", "ganho de massa")
+_PALAVRAS_OBJETIVO = ((1, {"emagre", "perder", "perda", "defini", "secar", "gordur", "cuttin"}),
+                      (2, {"hipert", "massa", "ganhar", "ganho", "bulk", "forca"}))
+AJUSTE_CALORIAS = np.array([0.0, -0.2, 0.1])
+PROTEINA_G_KG = np.array([1.6, 2.2, 2.0])
+GORDURA_G_KG = np.array([0.9, 0.8, 1.0])
+
+AGUA_ML_KG = 35.0
+AGUA_ML_HORA_TREINO = 500.0
+
+# Faixas aceitas: fora delas as fórmulas não valem (ou o dado veio errado)
+FAIXAS = {"peso": (30.0, 300.0), "altura": (100.0, 250.0), "idade": (10.0, 100.0)}
+
+def _coluna(perfis, campo, padrao=np.nan):
+    return np.array([p.get(campo, padrao) for p in perfis], dtype=float)
+
+def _objetivo(texto):
+    palavras = set(termos(texto or ""))
+    return next((codigo for codigo, chaves in _PALAVRAS_OBJETIVO if palavras & chaves), 0)
+
+def metas_lote(perfis):
+    # Um perfil por linha; devolve colunas (arrays numpy) para lotes inteiros de uma vez
+    peso, altura, idade = _coluna(perfis, "peso"), _coluna(perfis, "altura"), _coluna(perfis, "idade")
+    dias = np.clip(np.nan_to_num(_coluna(perfis, "dias_treino", 0)), 0, 7).astype(int)
+    minutos = np.nan_to_num(_coluna(perfis, "tempo_treino", 0))
+    sexo = np.array([AJUSTE_SEXO.get(p.get("sexo"), AJUSTE_SEXO_OUTRO) for p in perfis])
+    ativo = np.array([p.get("trabalho") == "Ativo" for p in perfis])
+    objetivo = np.array([_objetivo(p.get("objetivo_detalhado")) for p in perfis], dtype=int)
+
+    tmb = 10 * peso + 6.25 * altura - 5 * idade + sexo
+    fator = FATOR_ATIVIDADE[dias] + BONUS_TRABALHO_ATIVO * ativo
+    gasto = tmb * fator
+    # O déficit nunca leva a meta abaixo da TMB
+    calorias = np.maximum(gasto * (1 + AJUSTE_CALORIAS[objetivo]), tmb)
+    proteina = PROTEINA_G_KG[objetivo] * peso
+    gordura = GORDURA_G_KG[objetivo] * peso
+    carboidrato = np.maximum(calorias - 4 * proteina - 9 * gordura, 0) / 4
+    # Água: 35 ml/kg + 500 ml por hora de treino, distribuídos pela semana
+    agua = (AGUA_ML_KG * peso + AGUA_ML_HORA_TREINO * minutos / 60 * dias / 7) / 1000
+    return {"tmb": tmb, "fator_atividade": fator, "gasto": gasto, "objetivo": objetivo, "calorias": calorias,
+            "proteina_g": proteina, "carboidrato_g": carboidrato, "gordura_g": gordura, "agua_l": agua,
+            "agua_atual_l": _coluna(perfis, "agua_atual")}
+
+def metas(perfil):
+    return {nome: valores[0].item() for nome, valores in metas_lote([perfil]).items()}
+
+def perfis_invalidos(perfis):
+    # Índices dos perfis com peso/altura/idade ausentes ou fora das faixas das fórmulas
+    invalido = np.zeros(len(perfis), dtype=bool)
+    for campo, (minimo, maximo) in FAIXAS.items():
+        valores = _coluna(perfis, campo)
+        invalido |= ~((valores >= minimo) & (valores <= maximo))
+    return np.flatnonzero(invalido).tolist()
+
+# --- Tabelas locais ---
+
+# (nome, grupo, kcal, proteína, carboidrato, gordura por 100 g, custo 1-3, restrições que o excluem)
+ALIMENTOS = [
+    ("Peito de frango", "proteina", 159, 32.0, 0.0, 2.5, 1, {"carne"}),
+    ("Ovo (50 g cada)", "proteina", 143, 13.0, 0.7, 9.5, 1, {"ovo"}),
+    ("Carne moída magra", "proteina", 212, 26.0, 0.0, 11.0, 2, {"carne"}),
+    ("Patinho bovino", "proteina", 219, 36.0, 0.0, 7.3, 2, {"carne"}),
+    ("Sardinha em lata", "proteina", 208, 25.0, 0.0, 11.5, 1, {"peixe"}),
+    ("Atum em lata", "proteina", 118, 26.0, 0.0, 1.0, 2, {"peixe"}),
+    ("Tilápia", "proteina", 128, 26.0, 0.0, 2.7, 2, {"peixe"}),
+    ("Salmão", "proteina", 208, 20.0, 0.0, 13.0, 3, {"peixe"}),
+    ("Camarão", "proteina", 99, 24.0, 0.2, 0.3, 3, {"peixe", "frutos_mar"}),
+    ("Iogurte natural", "proteina", 61, 3.5, 4.7, 3.3, 1, {"lactose", "leite"}),
+    ("Queijo cottage", "proteina", 98, 11.0, 3.4, 4.3, 2, {"lactose", "leite"}),
+    ("Whey protein", "proteina", 390, 78.0, 8.0, 6.0, 3, {"lactose", "leite"}),
+    ("Tofu", "proteina", 76, 8.0, 1.9, 4.8, 2, {"soja"}),
+    ("Proteína de soja texturizada", "proteina", 330, 50.0, 30.0, 1.0, 1, {"soja"}),
+    ("Lentilha cozida", "proteina", 116, 9.0, 20.0, 0.4, 1, set()),
+    ("Grão-de-bico cozido", "proteina", 164, 8.9, 27.0, 2.6, 1, set()),
+    ("Arroz branco cozido", "carboidrato", 128, 2.5, 28.0, 0.2, 1, set()),
+    ("Arroz integral cozido", "carboidrato", 124, 2.6, 26.0, 1.0, 1, set()),
+    ("Feijão carioca cozido", "carboidrato", 76, 4.8, 13.6, 0.5, 1, set()),
+    ("Batata-doce cozida", "carboidrato", 77, 0.6, 18.4, 0.1, 1, set()),
+    ("Mandioca cozida", "carboidrato", 125, 0.6, 30.0, 0.3, 1, set()),
+    ("Aveia em flocos", "carboidrato", 394, 13.9, 66.6, 8.5, 1, {"gluten"}),
+    ("Pão integral", "carboidrato", 253, 9.4, 49.9, 3.7, 1, {"gluten"}),
+    ("Macarrão cozido", "carboidrato", 157, 5.8, 30.9, 0.9, 1, {"gluten"}),
+    ("Cuscuz de milho", "carboidrato", 113, 2.2, 25.3, 0.7, 1, set()),
+    ("Tapioca", "carboidrato", 240, 0.0, 60.0, 0.0, 1, set()),
+    ("Quinoa cozida", "carboidrato", 120, 4.4, 21.3, 1.9, 3, set()),
+    ("Azeite de oliva", "gordura", 884, 0.0, 0.0, 100.0, 2, set()),
+    ("Pasta de amendoim", "gordura", 588, 25.0, 20.0, 50.0, 2, {"amendoim"}),
+    ("Castanha-do-pará", "gordura", 656, 14.3, 12.3, 66.4, 3, {"castanhas"}),
+    ("Abacate", "gordura", 96, 1.2, 6.0, 8.4, 1, set()),
+    ("Banana", "fruta", 98, 1.3, 26.0, 0.1, 1, set()),
+    ("Maçã", "fruta", 56, 0.3, 15.2, 0.0, 1, set()),
+    ("Mamão", "fruta", 40, 0.5, 10.4, 0.1, 1, set()),
+    ("Morango", "fruta", 30, 0.9, 6.8, 0.3, 2, set()),
+    ("Mirtilo", "fruta", 57, 0.7, 14.5, 0.3, 3, set()),
+    ("Brócolis cozido", "vegetal", 25, 2.1, 4.4, 0.5, 1, set()),
+    ("Alface e tomate", "vegetal", 15, 1.0, 3.0, 0.2, 1, set()),
+    ("Cenoura", "vegetal", 34, 1.3, 7.7, 0.2, 1, set()),
+    ("Abobrinha", "vegetal", 19, 1.1, 4.3, 0.1, 1, set()),
+]
+GRUPOS_ALIMENTOS = ("proteina", "carboidrato", "gordura", "fruta", "vegetal")
+
+# (nome, grupo, locais, articulações sobrecarregadas)
+EXERCICIOS = [
+    ("Agachamento livre", "pernas", {"Academia"}, {"joelho", "lombar"}),
+    ("Leg press", "pernas", {"Academia"}, {"joelho"}),
+    ("Cadeira extensora", "pernas", {"Academia"}, {"joelho"}),
+    ("Mesa flexora", "pernas", {"Academia"}, set()),
+    ("Levantamento terra romeno", "pernas", {"Academia"}, {"lombar"}),
+    ("Elevação pélvica", "pernas", {"Academia", "Casa"}, set()),
+    ("Agachamento goblet", "pernas", {"Academia", "Casa"}, {"joelho"}),
+    ("Afundo", "pernas", {"Academia", "Casa", "Parque"}, {"joelho"}),
+    ("Ponte de glúteo", "pernas", {"Casa", "Parque"}, set()),
+    ("Subida no banco", "pernas", {"Casa", "Parque"}, {"joelho"}),
+    ("Supino reto", "peito", {"Academia"}, {"ombro"}),
+    ("Supino inclinado com halteres", "peito", {"Academia"}, {"ombro"}),
+    ("Crucifixo na máquina", "peito", {"Academia"}, set()),
+    ("Flexão de braço", "peito", {"Academia", "Casa", "Parque"}, {"ombro"}),
+    ("Flexão inclinada no banco", "peito", {"Casa", "Parque"}, set()),
+    ("Puxada frontal", "costas", {"Academia"}, set()),
+    ("Remada baixa", "costas", {"Academia"}, set()),
+    ("Remada curvada", "costas", {"Academia"}, {"lombar"}),
+    ("Remada unilateral com halter", "costas", {"Academia", "Casa"}, set()),
+    ("Barra fixa", "costas", {"Academia", "Parque"}, {"ombro"}),
+    ("Remada com elástico", "costas", {"Casa", "Parque"}, set()),
+    ("Desenvolvimento com halteres", "ombros", {"Academia", "Casa"}, {"ombro"}),
+    ("Elevação lateral", "ombros", {"Academia", "Casa"}, set()),
+    ("Face pull", "ombros", {"Academia"}, set()),
+    ("Prancha", "core", {"Academia", "Casa", "Parque"}, set()),
+    ("Dead bug", "core", {"Academia", "Casa", "Parque"}, set()),
+    ("Abdominal bicicleta", "core", {"Academia", "Casa", "Parque"}, {"lombar"}),
+    ("Bicicleta ergométrica", "cardio", {"Academia"}, set()),
+    ("Elíptico", "cardio", {"Academia"}, set()),
+    ("Corrida", "cardio", {"Parque"}, {"joelho"}),
+    ("Caminhada rápida", "cardio", {"Parque", "Casa"}, set()),
+    ("Polichinelo", "cardio", {"Casa", "Parque"}, {"joelho"}),
+]
+GRUPOS_EXERCICIOS = ("pernas", "peito", "costas", "ombros", "core", "cardio")
+
+# Texto livre de restrições/lesões -> marcas das tabelas. Cada chave é um prefixo de palavra (regex) sobre o
+# texto sem acentos e sem cortar as palavras, para pegar gênero e plural (vegano/vegana/veganos, ovo/ovos).
+_RESTRICOES = {
+    r"lactos": {"lactose"}, r"leite": {"leite", "lactose"}, r"latici": {"leite", "lactose"},
+    r"gluten": {"gluten"}, r"trigo": {"gluten"}, r"celiac": {"gluten"},
+    r"vegan": {"carne", "peixe", "frutos_mar", "ovo", "leite", "lactose"},
+    r"(ovo)?(lacto)?vegetarian": {"carne", "peixe", "frutos_mar"}, r"carnes?\b": {"carne"},
+    r"peixes?\b": {"peixe"}, r"frutos? do mar": {"frutos_mar"}, r"camar": {"frutos_mar"},
+    r"ovos?\b": {"ovo"}, r"amendoi": {"amendoim"}, r"castanha": {"castanhas"}, r"noz(es)?\b": {"castanhas"},
+    r"soja": {"soja"},
+}
+_LESOES = {r"joelho": {"joelho"}, r"menisc": {"joelho"}, r"patela": {"joelho"}, r"ligament": {"joelho"},
+           r"ombro": {"ombro"}, r"manguito": {"ombro"},
+           r"lombar": {"lombar"}, r"coluna": {"lombar"}, r"hernia": {"lombar"}, r"costas": {"lombar"}}
+CUSTO_MAXIMO = {"Baixo": 1, "Médio": 2, "Alto": 3}
+
+def _sem_acentos(texto):
+    texto = unicodedata.normalize("NFKD", (texto or "").lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+def _marcas(texto, tabela):
+    texto = _sem_acentos(texto)
+    return set().union(*(marcas for prefixo, marcas in tabela.items() if re.search(r"\b" + prefixo, texto)))
+
+class _Tabela:
+    # Colunas numpy + índice por grupo e por marca (restrição, local, articulação): filtrar é só combinar máscaras
+    def __init__(self, linhas, grupos, colunas_numericas=()):
+        self.nomes = np.array([l[0] for l in linhas])
+        self.grupo = np.array([l[1] for l in linhas])
+        self.por_grupo = {g: self.grupo == g for g in grupos}
+        self.colunas = {nome: np.array([l[i] for l in linhas], dtype=float) for nome, i in colunas_numericas}
+        self._por_marca = {}
+
+    def indexar(self, nome, conjuntos):
+        for marca in set().union(*conjuntos):
+            self._por_marca[(nome, marca)] = np.array([marca in c for c in conjuntos])
+
+    def mascara(self, nome, marcas):
+        mascara = np.zeros(len(self.nomes), dtype=bool)
+        for marca in marcas:
+            mascara |= self._por_marca.get((nome, marca), False)
+        return mascara
+
+_alimentos = _Tabela(ALIMENTOS, GRUPOS_ALIMENTOS, (("kcal", 2), ("proteina", 3), ("custo", 6)))
+_alimentos.indexar("restricao", [l[7] for l in ALIMENTOS])
+_exercicios = _Tabela(EXERCICIOS, GRUPOS_EXERCICIOS)
+_exercicios.indexar("local", [l[2] for l in EXERCICIOS])
+_exercicios.indexar("articulacao", [l[3] for l in EXERCICIOS])
+
+def alimentos_permitidos(perfil, por_grupo=4):
+    # {grupo: [nomes]} dentro do orçamento e sem as restrições; proteínas por densidade (g de proteína por kcal)
+    custo_maximo = CUSTO_MAXIMO.get(perfil.get("orcamento"), 3)
+    permitido = (_alimentos.colunas["custo"] <= custo_maximo) & ~_alimentos.mascara(
+        "restricao", _marcas(perfil.get("restricoes"), _RESTRICOES))
+    densidade = _alimentos.colunas["proteina"] / _alimentos.colunas["kcal"]
+    escolhas = {}
+    for grupo, do_grupo in _alimentos.por_grupo.items():
+        indices = np.flatnonzero(permitido & do_grupo)
+        chave = -densidade[indices] if grupo == "proteina" else _alimentos.colunas["custo"][indices]
+        escolhas[grupo] = indices[np.argsort(chave, kind="stable")][:por_grupo].tolist()
+    return escolhas
+
+def exercicios_indicados(perfil, por_grupo=3):
+    # ({grupo: [nomes]}, [nomes evitados]) para o local de treino, sem sobrecarregar as articulações com lesão
+    no_local = _exercicios.mascara("local", {perfil.get("local_treino") or "Academia"})
+    evitar = _exercicios.mascara("articulacao", _marcas(perfil.get("lesoes"), _LESOES)) & no_local
+    indicados = {grupo: _exercicios.nomes[no_local & ~evitar & do_grupo][:por_grupo].tolist()
+                 for grupo, do_grupo in _exercicios.por_grupo.items()}
+    return indicados, _exercicios.nomes[evitar].tolist()
+
+def _refeicoes(perfil):
+    try:
+        return int(str(perfil.get("refeicoes_dia", "4")).rstrip("+"))
+    except ValueError:
+        return 4
+
+def _porcao(indice, proteina_refeicao):
+    # Gramas do alimento para a proteína de uma refeição, arredondadas de 10 em 10 g (teto de 300 g)
+    gramas = proteina_refeicao / _alimentos.colunas["proteina"][indice] * 100
+    return int(min(300, max(10, round(gramas / 10) * 10)))
+
+def fatos_por_agente(perfil):
+    # Blocos de texto com os números prontos, anexados à tarefa de cada agente
+    m = metas(perfil)
+    refeicoes = _refeicoes(perfil)
+    proteina_refeicao = m["proteina_g"] / refeicoes
+    agua = f"água {m['agua_l']:.1f} L/dia"
+    if not np.isnan(m["agua_atual_l"]):
+        agua += f" (hoje {m['agua_atual_l']:.1f} L, diferença {m['agua_l'] - m['agua_atual_l']:+.1f} L)"
+    alimentos = alimentos_permitidos(perfil)
+    linhas_alimentos = [f"- {grupo.capitalize()}: " + ", ".join(
+        f"{_alimentos.nomes[i]} ({_porcao(i, proteina_refeicao)} g/refeição)" if grupo == "proteina"
+        else str(_alimentos.nomes[i]) for i in indices) for grupo, indices in alimentos.items() if indices]
+    indicados, evitados = exercicios_indicados(perfil)
+    linhas_exercicios = [f"- {grupo.capitalize()}: {', '.join(nomes)}" for grupo, nomes in indicados.items() if nomes]
+    evitar = f"\nEVITAR PELAS LESÕES: {', '.join(evitados)}." if evitados else ""
+
+    nutricao = (f"\nMETAS CALCULADAS (use estes números, não recalcule): TMB {m['tmb']:.0f} kcal; "
+                f"gasto {m['gasto']:.0f} kcal (fator {m['fator_atividade']:.2f}); objetivo {OBJETIVOS[int(m['objetivo'])]}: "
+                f"{m['calorias']:.0f} kcal/dia; proteína {m['proteina_g']:.0f} g, carboidrato {m['carboidrato_g']:.0f} g, "
+                f"gordura {m['gordura_g']:.0f} g; {agua}. Em {refeicoes} refeições: ~{proteina_refeicao:.0f} g de proteína cada."
+                f"\nALIMENTOS DENTRO DO ORÇAMENTO E DAS RESTRIÇÕES:\n" + "\n".join(linhas_alimentos))
+    return {
+        "Personal Trainer": f"\nEXERCÍCIOS DISPONÍVEIS ({perfil.get('local_treino') or 'Academia'}):\n"
+                            + "\n".join(linhas_exercicios) + evitar,
+        "Fisioterapeuta": evitar,
+        "Nutricionista": nutricao,
+        "Coach de Saúde": f"\nHIDRATAÇÃO CALCULADA: {agua}. Meta de calorias do dia: {m['calorias']:.0f} kcal.",
+    }
@@ -0,0 +1,188 @@
+# roteador.py
+import os
+import threading
+import time
+from collections import deque
+from contexto import estimar_tokens
+from limitador import dica_do_servidor
+from modelos import obter_modelo, chave_api
+from rastreio import registrar, percentil
+
+# Perfis de modelo: validação curta (sim/não + ajustes) vai no barato e rápido; a consolidação final no mais forte.
+# timeout vai no request_options da chamada, o resto no generation_config.
+PERFIS = {
+    "validacao": {"modelo": "gemini-2.5-flash-lite", "temperature": 0.2, "max_output_tokens": 2048, "timeout": 30},
+    "redacao": {"modelo": "gemini-2.5-flash-lite", "temperature": 0.7, "max_output_tokens": 8192, "timeout": 90},
+    "consolidacao": {"modelo": "gemini-2.5-flash", "temperature": 0.5, "max_output_tokens": 8192, "timeout": 120},
+    # Cota separada na API: é para onde as rotas fogem quando o modelo principal está em 429
+    "reserva": {"modelo": "gemini-2.0-flash", "temperature": 0.7, "max_output_tokens": 8192, "timeout": 90},
+}
+
+# Papel -> perfis em ordem de preferência
+ROTAS = {
+    "Personal Trainer": ("redacao", "reserva"),
+    "Fisioterapeuta": ("validacao", "reserva"),
+    "Nutricionista": ("redacao", "reserva"),
+    "Coach de Saúde": ("consolidacao", "redacao"),
+    "Chat": ("redacao", "reserva"),
+}
+ROTA_PADRAO = ("redacao", "reserva")
+
+# US$ por milhão de tokens (entrada, saída)
+PRECOS = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.0-flash": (0.10, 0.40),
+}
+
+# Depois de um 429, o perfil fica de lado por esse tempo (ou pela dica do servidor, se maior)
+SEGUNDOS_SATURADO = 20.0
+MAX_LATENCIAS = 1000
+
+def _config(perfil):
+    return {"temperature": perfil["temperature"], "max_output_tokens": perfil["max_output_tokens"]}
+
+def _erros_de_sobrecarga():
+    from google.api_core import exceptions as google_exceptions
+    return google_exceptions.TooManyRequests, google_exceptions.DeadlineExceeded
+
+class _RespostaContabilizada:
+    # Stream repassado pedaço a pedaço; a conta (latência e tokens) fecha quando o stream termina.
+    # fallback diz se quem respondeu foi um perfil de reserva (a resposta não entra no cache do perfil principal).
+    def __init__(self, resposta, ao_terminar, perfil, fallback):
+        self._resposta = resposta
+        self._ao_terminar = ao_terminar
+        self.perfil = perfil
+        self.fallback = fallback
+
+    text = property(lambda self: self._resposta.text)
+    usage_metadata = property(lambda self: getattr(self._resposta, "usage_metadata", None))
+
+    def __iter__(self):
+        partes = []
+        for pedaco in self._resposta:
+            try:
+                partes.append(pedaco.text)
+            except ValueError:
+                pass
+            yield pedaco
+        if self._ao_terminar:
+            self._ao_terminar(self.usage_metadata, "".join(partes))
+
+class ModeloRoteado:
+    # Mesmo contrato do GenerativeModel; model_name/config do perfil principal entram na chave do cache,
+    # por isso respostas de um perfil de reserva saem marcadas com fallback=True e não são guardadas
+    def __init__(self, roteador, perfis):
+        self._roteador = roteador
+        self.perfis = perfis
+        principal = roteador.perfis[perfis[0]]
+        self.model_name = principal["modelo"]
+        self._generation_config = _config(principal)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        sobrecarga = _erros_de_sobrecarga()
+        ultimo_erro = None
+        for nome in self._roteador.ordem(self.perfis):
+            modelo = self._roteador.modelo(nome)
+            if modelo is None:
+                continue
+            inicio = time.perf_counter()
+            try:
+                resposta = modelo.generate_content(prompt, stream=stream,
+                                                   request_options={"timeout": self._roteador.perfis[nome]["timeout"]},
+                                                   **kwargs)
+            except sobrecarga as e:
+                self._roteador.marcar_sobrecarga(nome, e)
+                ultimo_erro = e
+                continue
+            fallback = nome != self.perfis[0]
+
+            def contabilizar(meta, texto, nome=nome, inicio=inicio, fallback=fallback):
+                entrada = getattr(meta, "prompt_token_count", 0) or estimar_tokens(prompt)
+                saida = getattr(meta, "candidates_token_count", 0) or estimar_tokens(texto)
+                self._roteador.contabilizar(nome, time.perf_counter() - inicio, entrada, saida, fallback)
+
+            if stream:
+                return _RespostaContabilizada(resposta, contabilizar, nome, fallback)
+            contabilizar(getattr(resposta, "usage_metadata", None), resposta.text)
+            return _RespostaContabilizada(resposta, None, nome, fallback)
+        # Todos os perfis da rota em 429/timeout: o limitador de quem chamou faz o backoff
+        if ultimo_erro is None:
+            raise RuntimeError("Nenhum modelo disponível para a rota " + " -> ".join(self.perfis))
+        raise ultimo_erro
+
+class Roteador:
+    def __init__(self, perfis=None, rotas=None, fabrica=None, backend=None):
+        self.perfis = perfis or PERFIS
+        self.rotas = rotas or ROTAS
+        self.backend = backend or os.environ.get("MPT_BACKEND", "gemini")
+        # fabrica(nome_modelo, config) -> modelo; o padrão é o registro de modelos.py
+        self._fabrica = fabrica or (lambda nome, config: obter_modelo(nome, config, self.backend))
+        self._saturado_ate = {}
+        self._lock = threading.Lock()
+        self.metricas = {nome: {"chamadas": 0, "fallbacks": 0, "throttles": 0, "timeouts": 0,
+                                "tokens_entrada": 0, "tokens_saida": 0, "custo_usd": 0.0,
+                                "latencias": deque(maxlen=MAX_LATENCIAS)} for nome in self.perfis}
+
+    def disponivel(self):
+        return self.backend != "gemini" or bool(chave_api())
+
+    def para(self, papel):
+        return ModeloRoteado(self, self.rotas.get(papel, ROTA_PADRAO))
+
+    def modelo(self, nome):
+        perfil = self.perfis[nome]
+        return self._fabrica(perfil["modelo"], _config(perfil))
+
+    def ordem(self, perfis):
+        # Perfis saturados vão para o fim da fila, mas continuam lá: se todos estiverem, tenta na ordem original
+        agora = time.monotonic()
+        with self._lock:
+            livres = [p for p in perfis if self._saturado_ate.get(p, 0.0) <= agora]
+        return livres + [p for p in perfis if p not in livres]
+
+    def marcar_sobrecarga(self, nome, erro):
+        from google.api_core import exceptions as google_exceptions
+        throttle = isinstance(erro, google_exceptions.TooManyRequests)
+        with self._lock:
+            self.metricas[nome]["throttles" if throttle else "timeouts"] += 1
+            espera = max(SEGUNDOS_SATURADO, dica_do_servidor(erro) or 0.0) if throttle else SEGUNDOS_SATURADO
+            self._saturado_ate[nome] = time.monotonic() + espera
+
+    def contabilizar(self, nome, segundos, tokens_entrada, tokens_saida, fallback):
+        preco_entrada, preco_saida = PRECOS.get(self.perfis[nome]["modelo"], (0.0, 0.0))
+        with self._lock:
+            m = self.metricas[nome]
+            m["chamadas"] += 1
+            m["fallbacks"] += fallback
+            m["tokens_entrada"] += tokens_entrada
+            m["tokens_saida"] += tokens_saida
+            m["custo_usd"] += (tokens_entrada * preco_entrada + tokens_saida * preco_saida) / 1e6
+            m["latencias"].append(segundos)
+        registrar(f"llm.perfil.{nome}", segundos, tokens_entrada=tokens_entrada, tokens_saida=tokens_saida,
+                  fallback=fallback)
+
+    def estatisticas(self):
+        # Uma linha por perfil: chamadas, fallbacks atendidos, 429/timeouts, latência p50/p95 e custo
+        linhas = []
+        with self._lock:
+            for nome, m in self.metricas.items():
+                d = sorted(m["latencias"])
+                linhas.append({"perfil": nome, "modelo": self.perfis[nome]["modelo"],
+                               **{k: v for k, v in m.items() if k != "latencias"},
+                               "p50_ms": percentil(d, 50) * 1000, "p95_ms": percentil(d, 95) * 1000})
+        return linhas
+
+def modelo_para(model, papel):
+    # Com o roteador, cada papel ganha sua rota; um modelo simples (testes, benchmarks) atende todos os papéis
+    return model.para(papel) if isinstance(model, Roteador) else model
+
+_roteador = None
+_roteador_lock = threading.Lock()
+
+def obter_roteador():
+    global _roteador
+    with _roteador_lock:
+        if _roteador is None:
+            _roteador = Roteador()
+        return _roteador